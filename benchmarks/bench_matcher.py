@@ -0,0 +1,37 @@
+"""Benchmark of the strict list matching against pairwise comparison.
+
+Run with `python benchmarks/bench_matcher.py`.
+"""
+
+import timeit
+
+from spintest.matcher import compile_matcher
+
+
+def pairwise_compare(body, expected):
+    """Strict list comparison trying every expected item for each body item."""
+    if len(body) != len(expected):
+        return False
+    return all(any(item == value for item in expected) for value in body)
+
+
+def bench(statement, number):
+    return min(timeit.repeat(statement, number=number, repeat=3)) / number * 1e3
+
+
+def main():
+    print(f"{'items':<10}{'pairwise':>14}{'compiled':>14}{'with None':>14}")
+    for size in (100, 1000, 5000):
+        expected = [{"id": index, "name": f"item-{index}"} for index in range(size)]
+        body = expected[::-1]
+        wildcards = expected[:-10] + [{"id": None, "name": None}] * 10
+        number = max(1, 10000 // size)
+
+        pairwise = bench(lambda: pairwise_compare(body, expected), 1)
+        compiled = bench(lambda: compile_matcher(expected)(body), number)
+        partial = bench(lambda: compile_matcher(wildcards)(body), number)
+        print(f"{size:<10}{pairwise:>12.2f}ms{compiled:>12.2f}ms{partial:>12.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
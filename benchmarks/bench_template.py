@@ -0,0 +1,45 @@
+"""Benchmark of the variable reference resolver against Jinja rendering.
+
+Run with `python benchmarks/bench_template.py`.
+"""
+
+import timeit
+
+import jinja2
+
+from spintest.template import environment, render
+from spintest.types import Int
+
+OUTPUT = {
+    "user": {"id": 1234, "name": "foo"},
+    "order": {"items": [{"sku": "A-1", "count": 3}], "total": 12.5},
+}
+
+CASES = [
+    ("simple reference", "{{ user.id }}"),
+    ("route", "/users/{{ user.id }}/orders/{{ order['items'][0].sku }}"),
+    ("nested subscripts", "{{ order['items'][0]['count'] }}"),
+    ("filter (Jinja fallback)", "{{ order['items'] | length }}"),
+]
+
+
+def bench(statement, number):
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e6
+
+
+def main(number=20000):
+    print(f"{'case':<26}{'Template()':>14}{'cached':>14}{'spintest':>14}")
+    for name, source in CASES:
+        template = environment.from_string(source)
+        uncached = bench(lambda: jinja2.Template(source).render(**OUTPUT), number // 10)
+        cached = bench(lambda: template.render(**OUTPUT), number)
+        resolved = bench(lambda: render(source, OUTPUT), number)
+        print(f"{name:<26}{uncached:>12.2f}us{cached:>12.2f}us{resolved:>12.2f}us")
+
+    value = Int("{{ order['items'][0]['count'] }}")
+    converted = bench(lambda: value.serialize(OUTPUT), number)
+    print(f"{'types.Int':<26}{'':>14}{'':>14}{converted:>12.2f}us")
+
+
+if __name__ == "__main__":
+    main()
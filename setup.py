@@ -31,4 +31,5 @@ setup(
     include_package_data=True,
     packages=find_packages(),
     install_requires=parse_requirements("requirements.txt"),
+    extras_require={"aiohttp": ["aiohttp"]},
 )
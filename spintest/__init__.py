@@ -17,6 +17,7 @@ logger.addHandler(handler)
 
 
 from spintest.manager import TaskManager  # noqa: E402
+from spintest.sharding import ShardedTaskManager  # noqa: E402
 
 
 def spintest(
@@ -26,21 +27,35 @@ def spintest(
     parallel: bool = False,
     verify: bool = True,
     generate_report: Optional[str] = None,
+    transport: Optional[str] = None,
+    processes: Optional[int] = None,
+    **kwargs,
 ):
-    """Programmatic wrapper for spintest."""
+    """Programmatic wrapper for spintest.
+
+    Extra keyword arguments are passed to the `TaskManager`.
+    With `processes`, the URLs are split across that many processes, see
+    `ShardedTaskManager`.
+    """
     loop = asyncio.new_event_loop()
-    task_manager = TaskManager(
+    manager_class = TaskManager
+    if processes is not None:
+        manager_class = ShardedTaskManager
+        kwargs["processes"] = processes
+    task_manager = manager_class(
         urls,
         tasks,
         token=token,
         parallel=parallel,
         verify=verify,
         generate_report=generate_report,
+        transport=transport,
+        **kwargs,
     )
     result = loop.run_until_complete(task_manager.run())
     loop.close()
     return result
 
 
-__all__ = ["spintest", "TaskManager"]
+__all__ = ["spintest", "TaskManager", "ShardedTaskManager"]
 __version__ = "0.5.0"
@@ -0,0 +1,340 @@
+"""Execution of the URLs distributed to workers over TCP.
+
+The coordinator splits the URLs into work units and serves them to the
+workers connected to it. The messages are JSON documents, one per line:
+
+- the worker sends `{"type": "hello", "key": ...}` once connected,
+- the coordinator sends `{"type": "unit", "unit": ..., "urls": [...],
+  "tasks": ..., "options": {...}}`, or `{"type": "stop"}` when done,
+- the worker streams `{"type": "result", "unit": ..., "results": [...]}`
+  for each step, then `{"type": "done", "unit": ..., "success": ...,
+  "reports": [...], "stats": {...}}`, with an `error` and no reports if
+  the results are not JSON values.
+
+A worker is started with `python -m spintest.distributed HOST:PORT`, the
+key being read from the `SPINTEST_WORKER_KEY` environment variable.
+"""
+
+import argparse
+import asyncio
+import hmac
+import importlib
+import json
+import os
+import secrets
+import sys
+
+from typing import Callable, Dict, List, Optional, Union
+
+from spintest import logger
+from spintest.manager import TaskManager
+from spintest.plan import compile_scenario
+from spintest.sharding import merge_stats
+
+KEY_VARIABLE = "SPINTEST_WORKER_KEY"
+# Reports of large units are sent as a single line.
+STREAM_LIMIT = 2**26
+
+
+def resolve_tasks(tasks: Union[str, List[Dict]]) -> List[Dict]:
+    """Return the tasks of a scenario, importing a `module:attribute` one."""
+    if not isinstance(tasks, str):
+        return tasks
+    module_name, _, attribute = tasks.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+class EncodingError(ValueError):
+    """The message holds values that are not JSON."""
+
+
+def encode(message: dict) -> bytes:
+    """Encode a message, raise `EncodingError` if it is not JSON."""
+    try:
+        return json.dumps(message).encode("utf-8") + b"\n"
+    except (TypeError, ValueError) as e:
+        raise EncodingError(str(e)) from e
+
+
+async def send(writer: asyncio.StreamWriter, message: dict):
+    """Send a message."""
+    writer.write(encode(message))
+    await writer.drain()
+
+
+async def receive(reader: asyncio.StreamReader) -> dict:
+    """Receive a message, raise `ConnectionError` once the stream is closed."""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed.")
+    return json.loads(line)
+
+
+class DistributedTaskManager(object):
+    """Task manager serving the URLs as work units to workers over TCP.
+
+    The tasks are sent as JSON, so the scenarios with E2E targets or type
+    converters are given as a `module:attribute` reference imported by each
+    worker. `workers` local worker processes are started, other workers
+    can connect from remote nodes with the same key. A unit whose worker
+    disconnects is served again to another worker, so its streamed results
+    may be received twice.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        tasks: Union[str, List[Dict]],
+        token: Optional[str] = None,
+        workers: int = 0,
+        unit_size: int = 1,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        key: Optional[str] = None,
+        generate_report: Optional[str] = None,
+        **kwargs,
+    ):
+        """Initialization of `DistributedTaskManager` class.
+
+        Extra keyword arguments are passed to the `TaskManager` of each
+        work unit and must be JSON values.
+        """
+        if not isinstance(tasks, str):
+            try:
+                json.dumps(tasks)
+            except TypeError:
+                raise ValueError(
+                    "The tasks must be JSON values, or a 'module:attribute' "
+                    "reference to the tasks."
+                ) from None
+        try:
+            json.dumps({"token": token, **kwargs})
+        except TypeError:
+            raise ValueError(
+                "The token and the options of the task managers must be JSON values."
+            ) from None
+        if unit_size < 1:
+            raise ValueError("The unit size must be at least 1.")
+        self.urls = urls
+        self.tasks = tasks
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.key = key or secrets.token_hex(16)
+        self.generate_report = generate_report
+        self.options = {"token": token, **kwargs}
+        self.units = []
+        for start in range(0, len(urls), unit_size):
+            stop = start + unit_size
+            self.units.append(urls[start:stop])
+        self.unit_results = {}
+        self.processes = []
+        self.all_reports = []
+        self.stats = {}
+
+    def _unit(self, unit: int) -> dict:
+        return {
+            "type": "unit",
+            "unit": unit,
+            "urls": self.units[unit],
+            "tasks": self.tasks,
+            "options": self.options,
+        }
+
+    async def _next_unit(self) -> Optional[int]:
+        """Wait for a unit to serve, `None` once every unit is done."""
+        get = asyncio.ensure_future(self.pending.get())
+        finished = asyncio.ensure_future(self.finished.wait())
+        await asyncio.wait([get, finished], return_when=asyncio.FIRST_COMPLETED)
+        if get.done():
+            finished.cancel()
+            return get.result()
+        get.cancel()
+        return None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve the work units to a connected worker."""
+        unit = None
+        try:
+            hello = await receive(reader)
+            if hello.get("type") != "hello" or not hmac.compare_digest(
+                str(hello.get("key")).encode("utf-8"), self.key.encode("utf-8")
+            ):
+                logger.error("Worker rejected, invalid key.")
+                return
+
+            while True:
+                unit = await self._next_unit()
+                if unit is None:
+                    await send(writer, {"type": "stop"})
+                    return
+                await send(writer, self._unit(unit))
+
+                message = await receive(reader)
+                while message["type"] == "result":
+                    if self.on_result is not None:
+                        self.on_result(message["results"])
+                    message = await receive(reader)
+
+                if message.get("error"):
+                    logger.error(f"Work unit {unit} failed: {message['error']}")
+                self.unit_results[unit] = message
+                unit = None
+                if len(self.unit_results) == len(self.units):
+                    self.finished.set()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, KeyError):
+            logger.error("Worker disconnected.")
+        finally:
+            if unit is not None:
+                self.pending.put_nowait(unit)
+            writer.close()
+
+    async def _start_worker(self):
+        """Start a local worker process."""
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-m",
+            "spintest.distributed",
+            f"{self.host}:{self.port}",
+            env={**os.environ, KEY_VARIABLE: self.key},
+        )
+        self.processes.append(process)
+
+    async def _wait_workers(self):
+        """Wait for the local workers, failing the units left once all exited."""
+        await asyncio.gather(*[process.wait() for process in self.processes])
+        if not self.finished.is_set():
+            logger.critical("Every local worker exited before the end of the run.")
+            self.finished.set()
+
+    async def run(self, on_result: Optional[Callable[[list], None]] = None) -> bool:
+        """Serve the work units until they are all done and merge the reports.
+
+        `on_result` is called with the results of each step of the workers
+        as soon as they are received. The port of the coordinator is set once
+        it is listening.
+        """
+        plan = compile_scenario(resolve_tasks(self.tasks))
+        if plan.errors:
+            for error in plan.errors:
+                logger.error(error)
+            logger.critical("Scenario validation failed.")
+            return False
+
+        self.on_result = on_result
+        self.pending = asyncio.Queue()
+        self.finished = asyncio.Event()
+        for unit in range(len(self.units)):
+            self.pending.put_nowait(unit)
+        if not self.units:
+            self.finished.set()
+
+        server = await asyncio.start_server(
+            self._serve, self.host, self.port, limit=STREAM_LIMIT
+        )
+        self.port = server.sockets[0].getsockname()[1]
+        logger.info(f"Serving {len(self.units)} work units on {self.host}:{self.port}.")
+        for _ in range(self.workers):
+            await self._start_worker()
+
+        watcher = None
+        if self.processes:
+            watcher = asyncio.ensure_future(self._wait_workers())
+        try:
+            await self.finished.wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+            if watcher is not None:
+                await watcher
+
+        results = [self.unit_results.get(unit) for unit in range(len(self.units))]
+        self.all_reports = [
+            report for result in results if result for report in result["reports"]
+        ]
+        self.stats = merge_stats([result["stats"] for result in results if result])
+
+        if self.generate_report is not None:
+            with open(self.generate_report, "w", encoding="utf-8") as file:
+                json.dump(self.all_reports, file, ensure_ascii=False)
+
+        return all(result is not None and result["success"] for result in results)
+
+
+async def worker(host: str, port: int, key: str):
+    """Run the work units served by a coordinator until it stops."""
+    reader, writer = await asyncio.open_connection(host, port, limit=STREAM_LIMIT)
+    try:
+        await send(writer, {"type": "hello", "key": key})
+        while True:
+            message = await receive(reader)
+            if message["type"] != "unit":
+                return
+
+            unit = message["unit"]
+            manager = TaskManager(
+                message["urls"], resolve_tasks(message["tasks"]), **message["options"]
+            )
+            errors = []
+
+            def on_result(results: list):
+                if errors:
+                    return
+                try:
+                    writer.write(
+                        encode({"type": "result", "unit": unit, "results": results})
+                    )
+                except EncodingError as e:
+                    errors.append(e)
+
+            success = await manager.run(on_result=on_result)
+            if not errors:
+                try:
+                    writer.write(
+                        encode(
+                            {
+                                "type": "done",
+                                "unit": unit,
+                                "success": success,
+                                "reports": manager.all_reports,
+                                "stats": manager.stats,
+                            }
+                        )
+                    )
+                except EncodingError as e:
+                    errors.append(e)
+            if errors:
+                logger.error(f"Work unit {unit} failed: {errors[0]}")
+                writer.write(
+                    encode(
+                        {
+                            "type": "done",
+                            "unit": unit,
+                            "success": False,
+                            "error": f"The results are not JSON values: {errors[0]}",
+                            "reports": [],
+                            "stats": {},
+                        }
+                    )
+                )
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    """Entry point of a worker process."""
+    parser = argparse.ArgumentParser(description="Run a spintest worker.")
+    parser.add_argument("address", help="HOST:PORT of the coordinator")
+    args = parser.parse_args(argv)
+    host, _, port = args.address.rpartition(":")
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(worker(host, int(port), os.environ[KEY_VARIABLE]))
+    finally:
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,37 @@
+import asyncio
 import time
 import json
-from spintest.validator import input_validator_e2e_task
+import logging
+from typing import Optional, Union
+from spintest.plan import CompiledTask, compile_task
 from spintest import logger
-from jinja2 import Template
+from spintest.template import render_tree, resolve
 
 
 class E2ETask:
     """E2E Task handler."""
 
-    def __init__(self, url: str, task: dict, output: dict = None):
-        """Initialization of `E2ETask` class."""
+    def __init__(
+        self,
+        url: str,
+        task: Union[dict, CompiledTask],
+        output: dict = None,
+        deadline: Optional[float] = None,
+    ):
+        """Initialization of `E2ETask` class.
+
+        A target still running at the `deadline`, a `time.monotonic()` value,
+        is cancelled with the `TIMEOUT` status.
+        """
         self.url = url
-        self.task = task
-        self.name = task.get("name")
-        self.target = task.get("target")
+        if not isinstance(task, CompiledTask):
+            task = compile_task(task, kind="e2e")
+        self.compiled_task = task
+        self.task = dict(task.spec)
+        self.name = self.task.get("name")
+        self.target = self.task.get("target")
         self.output = output
+        self.deadline = deadline
 
     def _response(self, status: str, task: str, message: str) -> dict:
         """Return the response with logging."""
@@ -29,45 +46,59 @@ class E2ETask:
             "message": message,
         }
 
-        log_level = {"SUCCESS": logger.info, "FAILURE": logger.error}
-        log_level.get(status, logger.critical)(json.dumps(result, indent=4))
+        log_level = {
+            "SUCCESS": logging.INFO,
+            "FAILURE": logging.ERROR,
+            "TIMEOUT": logging.ERROR,
+        }.get(status, logging.CRITICAL)
+        if logger.isEnabledFor(log_level):
+            logger.log(log_level, json.dumps(result, indent=4))
 
         result["output"] = self.output
         return result
 
     async def run(self) -> dict:
         """Run the E2E task."""
-        try:
-            input_validator_e2e_task(self.task)
-        except ValueError as e:
-            logger.error(f"Validation error for E2ETask '{self.name}': {e}")
+        error = self.compiled_task.error
+        if error:
+            logger.error(f"Validation error for E2ETask '{self.name}': {error}")
             return self._response(
                 "FAILURE",
                 "unknown",
-                f"Task '{self.name}' schema validation failed: {str(e)}",
+                f"Task '{self.name}' schema validation failed: {error}",
             )
 
         target_inputs = self.task.get("target_input", {})
 
-        if self.output:
-            template = Template(json.dumps(target_inputs))
-            target_inputs = json.loads(template.render(**self.output))
+        if self.output and not self.compiled_task.static:
             if isinstance(target_inputs, str):
-                target_inputs = target_inputs.replace("'", '"')
-                try:
-                    target_inputs = json.loads(target_inputs)
-                except json.JSONDecodeError:
-                    return self._response(
-                        "FAILURE",
-                        "unknown",
-                        f"Task '{self.name}' failed to parse target inputs.",
-                    )
+                target_inputs = resolve(target_inputs, self.output)
+            else:
+                target_inputs = render_tree(
+                    target_inputs, self.output, self.compiled_task.static_nodes
+                )
+
+        if self.output and isinstance(target_inputs, str):
+            target_inputs = target_inputs.replace("'", '"')
+            try:
+                target_inputs = json.loads(target_inputs)
+            except json.JSONDecodeError:
+                return self._response(
+                    "FAILURE",
+                    "unknown",
+                    f"Task '{self.name}' failed to parse target inputs.",
+                )
 
         logger.info(f"Running E2ETask: {self.name}")
         start_time = time.monotonic()
 
         try:
-            target_output = await self.target(url=self.url, **target_inputs)
+            target = self.target(url=self.url, **target_inputs)
+            if self.deadline is not None:
+                target = asyncio.wait_for(
+                    target, max(self.deadline - time.monotonic(), 0)
+                )
+            target_output = await target
             self.task["duration_sec"] = round(time.monotonic() - start_time, 2)
             output_variable = self.task.get("output")
             if output_variable:
@@ -76,6 +107,13 @@ class E2ETask:
             return self._response(
                 "SUCCESS", self.target.__name__, "Task executed successfully."
             )
+        except asyncio.TimeoutError:
+            self.task["duration_sec"] = round(time.monotonic() - start_time, 2)
+            return self._response(
+                "TIMEOUT",
+                self.target.__name__,
+                f"Task '{self.name}' exceeded its deadline.",
+            )
         except AssertionError as e:
             self.task["duration_sec"] = round(time.monotonic() - start_time, 2)
             logger.error(f"Assertion error in target for E2ETask '{self.name}': {e}")
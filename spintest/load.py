@@ -0,0 +1,467 @@
+"""Load testing with the scenarios."""
+
+import asyncio
+import json
+import logging
+import math
+import time
+
+from array import array
+from typing import Callable, Dict, List, Optional, Union
+
+from spintest import logger
+from spintest.manager import TaskManager
+
+
+def percentile(latencies: List[float], rank: float) -> Optional[float]:
+    """Nearest-rank percentile of sorted latencies."""
+    if not latencies:
+        return None
+    index = max(math.ceil(rank / 100 * len(latencies)) - 1, 0)
+    return latencies[index]
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 4)
+
+
+def latency_summary(latencies) -> dict:
+    """Return the mean, p50, p90, p99 and max of latencies."""
+    latencies = sorted(latencies)
+    return {
+        "mean": _round(sum(latencies) / len(latencies) if latencies else None),
+        "p50": _round(percentile(latencies, 50)),
+        "p90": _round(percentile(latencies, 90)),
+        "p99": _round(percentile(latencies, 99)),
+        "max": _round(percentile(latencies, 100)),
+    }
+
+
+def arrival_offset(
+    index: int, rate: float, final_rate: Optional[float], duration: Optional[float]
+) -> Optional[float]:
+    """Intended start of the iteration `index`, in seconds since the start.
+
+    The rate goes linearly from `rate` to `final_rate` over the duration.
+    `None` is returned if the iteration never starts, the rate reaching 0.
+    """
+    if final_rate is None or final_rate == rate or not duration:
+        return index / rate
+    # Solve rate * t + (final_rate - rate) * t ** 2 / (2 * duration) = index
+    a = (final_rate - rate) / (2 * duration)
+    discriminant = rate**2 + 4 * a * index
+    if discriminant < 0:
+        return None
+    return (math.sqrt(discriminant) - rate) / (2 * a)
+
+
+class LatencyStats(object):
+    """Latencies and errors of the requests of a task.
+
+    The corrected latencies are measured from the intended start of the
+    requests, in the open model.
+    """
+
+    def __init__(self, name: Optional[str], method: str, route: str):
+        """Initialization of `LatencyStats` class."""
+        self.name = name
+        self.method = method
+        self.route = route
+        self.latencies = array("d")
+        self.corrected_latencies = array("d")
+        self.errors = 0
+
+    def add(self, latency: float, error: bool, corrected: Optional[float] = None):
+        self.latencies.append(latency)
+        if corrected is not None:
+            self.corrected_latencies.append(corrected)
+        self.errors += error
+
+    def summary(self, elapsed: float) -> dict:
+        """Return the throughput, error rate and latency percentiles."""
+        requests = len(self.latencies)
+        summary = {
+            "name": self.name,
+            "method": self.method,
+            "route": self.route,
+            "requests": requests,
+            "errors": self.errors,
+            "error_rate": round(self.errors / requests, 4) if requests else 0.0,
+            "rps": round(requests / elapsed, 2) if elapsed else 0.0,
+            "latency_sec": latency_summary(self.latencies),
+        }
+        if self.corrected_latencies:
+            summary["corrected_latency_sec"] = latency_summary(self.corrected_latencies)
+        return summary
+
+
+class LoadRunner(object):
+    """Run a scenario as a load test.
+
+    In the closed model, each of the `users` virtual users runs the scenario
+    on an URL (in turn), again and again with new outputs, until the
+    `duration` in seconds is elapsed or it ran `iterations` times.
+    In the open model, with an `arrival_rate`, the iterations are started at
+    that rate per second (going linearly to `final_arrival_rate` over the
+    duration) whether or not the previous ones are done, until the
+    `duration` is elapsed or `iterations` are started. At most `max_active`
+    iterations run at once, the others being dropped.
+    A failed iteration runs its rollback and stops.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        tasks: List[Dict[str, str]],
+        users: int = 1,
+        duration: Optional[float] = None,
+        iterations: Optional[int] = None,
+        arrival_rate: Optional[float] = None,
+        final_arrival_rate: Optional[float] = None,
+        max_active: Optional[int] = None,
+        token: Union[str, Callable[..., str], None] = None,
+        generate_report: Optional[str] = None,
+        **kwargs,
+    ):
+        """Initialization of `LoadRunner` class.
+
+        Extra keyword arguments are passed to the `TaskManager` running the
+        tasks, for the options of the transport and of the scheduling.
+        """
+        if duration is None and iterations is None:
+            raise ValueError("A duration or a number of iterations is required.")
+        if users < 1:
+            raise ValueError("The number of users must be at least 1.")
+        if arrival_rate is not None and arrival_rate <= 0:
+            raise ValueError("The arrival rate must be positive.")
+        if final_arrival_rate is not None and (
+            arrival_rate is None or duration is None or final_arrival_rate < 0
+        ):
+            raise ValueError(
+                "A final arrival rate requires an arrival rate and a duration."
+            )
+        self.urls = urls
+        self.users = users
+        self.duration = duration
+        self.iterations = iterations
+        self.arrival_rate = arrival_rate
+        self.final_arrival_rate = final_arrival_rate
+        self.max_active = max_active
+        self.token = token
+        self.generate_report = generate_report
+        self.manager = TaskManager(urls, tasks, token=token, **kwargs)
+        self.stats = {}
+        self.iterations_done = 0
+        self.dropped = 0
+        self.lags = array("d")
+        self.report = None
+
+    def _stats(self, task) -> LatencyStats:
+        """Return the statistics of a task, per name, method and route."""
+        if task.kind == "e2e":
+            target = task.spec.get("target")
+            key = (task.name, "E2E", getattr(target, "__name__", str(target)))
+        else:
+            key = (task.name, task.spec.get("method"), task.spec.get("route"))
+        if key not in self.stats:
+            self.stats[key] = LatencyStats(*key)
+        return self.stats[key]
+
+    async def _run_task(
+        self, url: str, task, output: dict, lag: Optional[float] = None
+    ) -> dict:
+        """Run a task, recording its latency without the waits to send it.
+
+        The latency of each attempt is recorded, so that the retry delays are
+        not, the attempts retried counting as errors (except the polls).
+        With the scheduling `lag` of its iteration, the latency measured
+        from the intended start is recorded as well.
+        """
+        runner = self.manager._task_runner(url, task, output.copy())
+        start = time.monotonic()
+        result = await runner.run()
+        duration = time.monotonic() - start
+        stats = self._stats(task)
+
+        attempts = getattr(runner, "attempt_latencies", None)
+        if not attempts:
+            # E2E targets and tasks without request.
+            waited = result.get("queue_sec", 0) + result.get("limiter_sec", 0)
+            attempts = [(duration - waited, duration)]
+        for index, (latency, with_waits) in enumerate(attempts):
+            if index == len(attempts) - 1:
+                error = result["status"] != "SUCCESS"
+            else:
+                error = task.kind != "poll"
+            stats.add(latency, error, None if lag is None else lag + with_waits)
+        return result
+
+    async def _iteration(self, url: str, intended: Optional[float] = None) -> bool:
+        """Run the scenario once with new outputs.
+
+        `intended` is the time the iteration should have started at.
+        """
+        lag = None
+        if intended is not None:
+            lag = max(time.monotonic() - intended, 0.0)
+            self.lags.append(lag)
+        output = {"__token__": self.token}
+        rollback = []
+        for task in self.manager.plan:
+            rollback.extend(task.rollback[::-1])
+            result = await self._run_task(url, task, output, lag)
+            output = result["output"]
+            if result["status"] != "SUCCESS" and result["ignore"] is False:
+                while rollback:
+                    result = await self.manager._task_runner(
+                        url, rollback.pop(), output.copy(), rollback=True
+                    ).run()
+                    output = result["output"]
+                return False
+        return True
+
+    async def _user(self, index: int, deadline: Optional[float]):
+        """Run the iterations of a virtual user."""
+        url = self.urls[index % len(self.urls)]
+        iteration = 0
+        while self.iterations is None or iteration < self.iterations:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            await self._iteration(url)
+            iteration += 1
+            self.iterations_done += 1
+
+    async def _arrivals(self, start: float):
+        """Start the iterations at their intended time, open model."""
+        active = set()
+        index = 0
+        while self.iterations is None or index < self.iterations:
+            offset = arrival_offset(
+                index, self.arrival_rate, self.final_arrival_rate, self.duration
+            )
+            if offset is None or (
+                self.duration is not None and offset >= self.duration
+            ):
+                break
+            intended = start + offset
+            delay = intended - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            url = self.urls[index % len(self.urls)]
+            index += 1
+            if self.max_active is not None and len(active) >= self.max_active:
+                self.dropped += 1
+                continue
+            iteration = asyncio.ensure_future(self._iteration(url, intended))
+            iteration.add_done_callback(active.discard)
+            active.add(iteration)
+            self.iterations_done += 1
+
+        await asyncio.gather(*active)
+
+    async def run(self) -> dict:
+        """Run the load test and return its report."""
+        if not self.manager._validate_plan():
+            raise ValueError("Scenario validation failed.")
+
+        level = logger.level
+        logger.setLevel(max(level, logging.WARNING))
+        start = time.monotonic()
+        deadline = start + self.duration if self.duration is not None else None
+        try:
+            if self.arrival_rate is not None:
+                await self._arrivals(start)
+            else:
+                await asyncio.gather(
+                    *[self._user(index, deadline) for index in range(self.users)]
+                )
+        finally:
+            elapsed = time.monotonic() - start
+            logger.setLevel(level)
+            await self.manager.transport.close()
+
+        self.report = self._report(elapsed)
+        if self.generate_report is not None:
+            with open(self.generate_report, "w", encoding="utf-8") as file:
+                json.dump(self.report, file, ensure_ascii=False)
+        return self.report
+
+    def _report(self, elapsed: float) -> dict:
+        """Return the totals and the statistics of each task."""
+        tasks = [stats.summary(elapsed) for stats in self.stats.values()]
+        requests = sum(task["requests"] for task in tasks)
+        errors = sum(task["errors"] for task in tasks)
+        report = {
+            "model": "closed" if self.arrival_rate is None else "open",
+            "users": self.users,
+            "duration_sec": round(elapsed, 2),
+            "iterations": self.iterations_done,
+            "requests": requests,
+            "errors": errors,
+            "error_rate": round(errors / requests, 4) if requests else 0.0,
+            "rps": round(requests / elapsed, 2) if elapsed else 0.0,
+            "tasks": tasks,
+        }
+        if self.arrival_rate is not None:
+            del report["users"]
+            report["arrival_rate"] = self.arrival_rate
+            report["final_arrival_rate"] = self.final_arrival_rate
+            report["dropped"] = self.dropped
+            report["scheduling_lag_sec"] = latency_summary(self.lags)
+        return report
+
+
+SEARCHES = ("step", "binary")
+LATENCY_KEYS = ("mean", "p50", "p90", "p99", "max")
+
+
+def breaches(report: dict, slo: Dict[str, float]) -> List[str]:
+    """Return the objectives of the `slo` a load test report breaks.
+
+    The `error_rate` is the one of the whole run and the latencies (`mean`,
+    `p50`, `p90`, `p99`, `max`) are the corrected ones of each task. A load
+    test that dropped iterations breaks the `dropped` objective, and one
+    that sent no request the `requests` one, having measured nothing.
+    """
+    result = []
+    if not report["requests"]:
+        result.append("requests")
+    for key, threshold in slo.items():
+        if key == "error_rate":
+            broken = report["error_rate"] > threshold
+        else:
+            broken = any(
+                (task.get("corrected_latency_sec") or task["latency_sec"])[key]
+                > threshold
+                for task in report["tasks"]
+            )
+        if broken:
+            result.append(key)
+    if report.get("dropped"):
+        result.append("dropped")
+    return result
+
+
+class CapacitySearch(object):
+    """Search the highest arrival rate a scenario sustains within an SLO.
+
+    Each step is an open model load test of `step_duration` seconds at an
+    arrival rate. With the `step` search, the rate starts at `start_rate` and
+    goes up by `step` until the SLO is broken or `max_rate` is reached. With
+    the `binary` search, the rate is searched between `start_rate` and
+    `max_rate` until the interval is less than `precision`.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        tasks: List[Dict[str, str]],
+        slo: Dict[str, float],
+        start_rate: float,
+        step_duration: float,
+        step: Optional[float] = None,
+        max_rate: Optional[float] = None,
+        search: str = "step",
+        precision: float = 1.0,
+        generate_report: Optional[str] = None,
+        **kwargs,
+    ):
+        """Initialization of `CapacitySearch` class.
+
+        Extra keyword arguments are passed to the `LoadRunner` of each step.
+        """
+        if search not in SEARCHES:
+            raise ValueError(f"Unknown search '{search}', expected one of {SEARCHES}.")
+        unknown = set(slo) - set(LATENCY_KEYS) - {"error_rate"}
+        if not slo or unknown:
+            raise ValueError(
+                f"The SLO requires thresholds among 'error_rate' and {LATENCY_KEYS}."
+            )
+        if start_rate <= 0:
+            raise ValueError("The start rate must be positive.")
+        if step_duration <= 0:
+            raise ValueError("The step duration must be positive.")
+        if search == "step" and (step is None or step <= 0):
+            raise ValueError("The step search requires a positive step.")
+        if search == "binary" and (max_rate is None or max_rate <= start_rate):
+            raise ValueError("The binary search requires a max rate above the start.")
+        if precision <= 0:
+            raise ValueError("The precision must be positive.")
+        self.urls = urls
+        self.tasks = tasks
+        self.slo = slo
+        self.start_rate = start_rate
+        self.step_duration = step_duration
+        self.step = step
+        self.max_rate = max_rate
+        self.search = search
+        self.precision = precision
+        self.generate_report = generate_report
+        self.options = kwargs
+        self.steps = []
+        self.report = None
+
+    async def _load_test(self, rate: float) -> dict:
+        """Run a load test at an arrival rate and return its report."""
+        runner = LoadRunner(
+            self.urls,
+            self.tasks,
+            duration=self.step_duration,
+            arrival_rate=rate,
+            **self.options,
+        )
+        return await runner.run()
+
+    async def _sustains(self, rate: float) -> bool:
+        """Run a step and tell whether the rate is within the SLO."""
+        report = await self._load_test(rate)
+        broken = breaches(report, self.slo)
+        logger.info(
+            f"Capacity search: {rate} iterations/s "
+            + (f"breaks {', '.join(broken)}." if broken else "is sustained.")
+        )
+        self.steps.append({"sustained": not broken, "breaches": broken, **report})
+        return not broken
+
+    async def _step_search(self) -> Optional[float]:
+        best = None
+        rate = self.start_rate
+        while self.max_rate is None or rate <= self.max_rate:
+            if not await self._sustains(rate):
+                break
+            best = rate
+            rate += self.step
+        return best
+
+    async def _binary_search(self) -> Optional[float]:
+        low, high = self.start_rate, self.max_rate
+        if not await self._sustains(low):
+            return None
+        if await self._sustains(high):
+            return high
+        while high - low > self.precision:
+            middle = (low + high) / 2
+            if await self._sustains(middle):
+                low = middle
+            else:
+                high = middle
+        return low
+
+    async def run(self) -> dict:
+        """Run the search and return the highest sustained rate with the steps."""
+        if self.search == "binary":
+            capacity = await self._binary_search()
+        else:
+            capacity = await self._step_search()
+
+        self.report = {
+            "search": self.search,
+            "slo": self.slo,
+            "max_sustained_rate": capacity,
+            "steps": self.steps,
+        }
+        if self.generate_report is not None:
+            with open(self.generate_report, "w", encoding="utf-8") as file:
+                json.dump(self.report, file, ensure_ascii=False)
+        return self.report
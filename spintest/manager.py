@@ -3,12 +3,21 @@
 import asyncio
 import itertools
 import json
+import time
 
 from typing import Callable, Dict, List, Union, Optional
 
 from spintest import logger
 from spintest.task import Task
 from spintest.e2e_task import E2ETask
+from spintest.poll_task import PollTask
+from spintest.plan import compile_scenario
+from spintest.scheduler import RequestScheduler
+from spintest.template import template_cache
+from spintest.transport import TransportError, base_url, get_transport
+
+PARALLEL_MODES = ("pipeline", "lockstep")
+SCHEDULINGS = ("sequential", "dag")
 
 
 class TaskManager(object):
@@ -22,19 +31,113 @@ class TaskManager(object):
         parallel: bool = False,
         verify: bool = True,
         generate_report: Optional[str] = None,
+        transport=None,
+        pool_size: int = 10,
+        idle_timeout: Optional[float] = 15.0,
+        keep_alive: bool = True,
+        parallel_mode: str = "pipeline",
+        concurrency: Optional[int] = None,
+        scheduling: str = "sequential",
+        max_in_flight: Optional[int] = None,
+        max_per_host: Optional[int] = None,
+        rate_limit: Optional[float] = None,
+        url_rate_limit: Optional[float] = None,
+        route_rate_limits: Optional[Dict[str, float]] = None,
+        rate_burst: int = 1,
+        url_timeout: Optional[float] = None,
+        run_timeout: Optional[float] = None,
+        breaker_threshold: Optional[int] = None,
+        preflight: bool = False,
+        preflight_timeout: float = 5.0,
     ):
-        """Initialization of `TaskManager` class."""
+        """Initialization of `TaskManager` class.
+
+        Without `parallel`, a `concurrency` above 1 runs that many URLs at
+        once, each one with its own outputs.
+        With the "dag" `scheduling`, the tasks of an URL run as soon as the
+        tasks they depend on are done.
+        `max_in_flight` and `max_per_host` bound the HTTP requests sent at
+        once, in total and per host. `rate_limit`, `url_rate_limit` and
+        `route_rate_limits` bound their rate, in requests per second.
+        `url_timeout` and `run_timeout` are the seconds after which the tasks
+        still running on an URL, since its first task, or in the whole run are
+        cancelled with the `TIMEOUT` status. The rollback tasks are not.
+        After `breaker_threshold` consecutive connection failures on a base
+        URL, its remaining tasks are `SKIPPED` without sending any request.
+        With `preflight`, a connection to every base URL is opened at once
+        before the first task, the URLs unreachable within
+        `preflight_timeout` seconds being excluded from the run.
+        """
+        if parallel_mode not in PARALLEL_MODES:
+            raise ValueError(
+                f"Unknown parallel mode '{parallel_mode}', "
+                f"expected one of {', '.join(PARALLEL_MODES)}."
+            )
+        if concurrency is not None and concurrency < 1:
+            raise ValueError("The concurrency must be at least 1.")
+        if scheduling not in SCHEDULINGS:
+            raise ValueError(
+                f"Unknown scheduling '{scheduling}', "
+                f"expected one of {', '.join(SCHEDULINGS)}."
+            )
+        if scheduling == "dag" and parallel and parallel_mode == "lockstep":
+            raise ValueError("The dag scheduling is not available in lockstep mode.")
+        for timeout in (url_timeout, run_timeout):
+            if timeout is not None and timeout <= 0:
+                raise ValueError("The timeouts must be positive.")
         self.urls = urls
         self.tasks = tasks
-        self.rollback_tasks = []
+        self.plan = compile_scenario(tasks)
+        self.rollback_tasks = {url: [] for url in urls}
+        self.stats = {"renders": 0, "renders_skipped": 0}
         self.token = token
         self.verify = verify
         self.parallel = parallel
+        self.parallel_mode = parallel_mode
+        self.concurrency = concurrency
+        self.scheduling = scheduling
+        self.critical_paths = {}
+        self.url_timeout = url_timeout
+        self.run_timeout = run_timeout
+        self.url_deadlines = {}
+        self.run_deadline = None
+        self.preflight = preflight
+        self.preflight_timeout = preflight_timeout
+        self.preflights = None
+        # URLs the scenario is run on, the unreachable ones being excluded by
+        # the pre-flight. The executors read them once started.
+        self.reachable_urls = urls
         self.generate_report = generate_report
+        self.scheduler = RequestScheduler(
+            max_in_flight,
+            max_per_host,
+            rate_limit=rate_limit,
+            url_rate_limit=url_rate_limit,
+            route_rate_limits=route_rate_limits,
+            rate_burst=rate_burst,
+            breaker_threshold=breaker_threshold,
+        )
+        self.transport = get_transport(
+            transport,
+            pool_size=pool_size,
+            idle_timeout=idle_timeout,
+            keep_alive=keep_alive,
+        )
 
         if self.parallel:
             self.outputs = [{"__token__": self.token}] * len(self.urls)
-            self.stack = self._parallel_executor()
+            if parallel_mode == "lockstep":
+                self.stack = self._parallel_executor()
+            else:
+                self.stack = self._pipeline_executor()
+        elif concurrency and concurrency > 1:
+            self.outputs = [{"__token__": self.token}] * len(self.urls)
+            self.stack = self._pipeline_executor()
+        elif scheduling == "dag":
+            # One URL at a time, the outputs are shared like sequentially.
+            self.outputs = [{"__token__": self.token}]
+            self.concurrency = 1
+            self.stack = self._pipeline_executor()
         else:
             self.outputs = [{"__token__": self.token}]
             self.stack = self._executor()
@@ -46,87 +149,85 @@ class TaskManager(object):
             logger.critical(critical)
         return [{"status": "FAILED", "ignore": False}]
 
-    def validate_refs(self) -> bool:
-        """Validate the integrity of task references."""
-        task_names = [task["name"] for task in self.tasks if task.get("name")]
-        for task in self.tasks:
-            for rollback in task.get("rollback", []):
-                if isinstance(rollback, str) and rollback not in task_names:
-                    logger.critical("Reference validation failed.")
-                    return False
-        return True
-
-    def rollback_lookup(self, name, activate_ignore=True):
-        """Get a task from a name."""
-        for task in self.tasks:
-            if task.get("name") == name:
-                rollback_task = task.copy()
-                if activate_ignore:
-                    rollback_task["ignore"] = True
-                return rollback_task
+    def _validate_plan(self) -> bool:
+        """Report the errors found while compiling the scenario."""
+        for error in self.plan.errors:
+            logger.error(error)
+        return not self.plan.errors
 
     def rollback_register(self, url, task):
-        """Register rollback tasks."""
-        for rollback in task.get("rollback", [])[::-1]:
-            if isinstance(rollback, str):
-                self.rollback_tasks.append((url, self.rollback_lookup(rollback)))
-            elif isinstance(rollback, dict):
-                rollback["ignore"] = True
-                self.rollback_tasks.append((url, rollback))
-            else:
-                return False
-        return True
+        """Register the rollback tasks of a task."""
+        self.rollback_tasks[url].extend(task.rollback[::-1])
+
+    def _deadline(self, url) -> Optional[float]:
+        """Deadline of the tasks of an URL, the timeouts starting with them."""
+        now = time.monotonic()
+        deadlines = []
+        if self.run_timeout is not None:
+            if self.run_deadline is None:
+                self.run_deadline = now + self.run_timeout
+            deadlines.append(self.run_deadline)
+        if self.url_timeout is not None:
+            deadlines.append(self.url_deadlines.setdefault(url, now + self.url_timeout))
+        return min(deadlines, default=None)
+
+    def _task_runner(self, url, task, output, rollback: bool = False):
+        """Return the runner of a compiled task.
+
+        The rollback tasks run without the deadline of the URL.
+        """
+        if task.static:
+            self.stats["renders_skipped"] += 1
+        else:
+            self.stats["renders"] += 1
+
+        deadline = None if rollback else self._deadline(url)
+        if task.kind == "e2e":
+            return E2ETask(url=url, task=task, output=output, deadline=deadline)
+        return (PollTask if task.kind == "poll" else Task)(
+            url,
+            task,
+            output=output,
+            verify=self.verify,
+            transport=self.transport,
+            scheduler=self.scheduler,
+            deadline=deadline,
+        )
 
-    async def rollback_executor(self, url=None):
-        """Execute the rollback stack."""
-        for rollback_url, rollback_task in self.rollback_tasks[::-1]:
-            if url is not None and rollback_url != url:
-                continue
+    def _output_index(self, url) -> int:
+        """Index of the outputs of an URL, shared by all URLs if only one."""
+        if len(self.outputs) == 1:
+            return 0
+        return self.urls.index(url)
 
-            if self.parallel:
-                output = self.outputs[self.urls.index(url)].copy()
-            else:
-                output = self.outputs[0].copy()
+    async def rollback_executor(self, url):
+        """Execute the rollback stack of an URL."""
+        index = self._output_index(url)
+        while self.rollback_tasks[url]:
+            rollback_task = self.rollback_tasks[url].pop()
 
-            result = await Task(
-                rollback_url, rollback_task, output=output, verify=self.verify
+            result = await self._task_runner(
+                url, rollback_task, self.outputs[index].copy(), rollback=True
             ).run()
 
-            if self.parallel:
-                self.outputs[self.urls.index(url)] = result["output"]
-            else:
-                self.outputs = [result["output"]]
+            self.outputs[index] = result["output"]
 
             yield [result]
 
     async def _executor(self) -> list:
         """Private task executor."""
-        is_refs_validated = self.validate_refs()
-        if not is_refs_validated:
-            yield self._error(critical="Rollback scenario validation failed.")
+        if not self._validate_plan():
+            yield self._error(critical="Scenario validation failed.")
             return
 
-        for url in self.urls:
+        for url in self.reachable_urls:
             is_success = True
-            for task in self.tasks:
-                is_registered = self.rollback_register(url, task)
-                if not is_registered:
-                    yield self._error(critical="Invalid rollback schema.")
-                    return
-
-                if task.get("target") is None:
-                    task["type"] = "http_request"
-
-                if task.get("type") != "http_request":
-                    result = await E2ETask(
-                        url=url,
-                        task=task,
-                        output=self.outputs[0].copy(),
-                    ).run()
-                else:
-                    result = await Task(
-                        url, task, output=self.outputs[0].copy(), verify=self.verify
-                    ).run()
+            for task in self.plan:
+                self.rollback_register(url, task)
+
+                result = await self._task_runner(
+                    url, task, self.outputs[0].copy()
+                ).run()
 
                 self.outputs = [result["output"]]
 
@@ -136,20 +237,21 @@ class TaskManager(object):
                     break
 
             if not is_success:
-                async for rollback in self.rollback_executor():
+                async for rollback in self.rollback_executor(url):
                     yield rollback
 
     async def _parallel_executor(self) -> list:
         """Private parallel task executor."""
-        is_refs_validated = self.validate_refs()
-        if not is_refs_validated:
-            yield self._error(critical="Rollback scenario validation failed.")
+        if not self._validate_plan():
+            yield self._error(critical="Scenario validation failed.")
             return
 
-        state = {url: None for url in self.urls}
-        for task in self.tasks:
+        state = {url: None for url in self.reachable_urls}
+        for task in self.plan:
             task_run_list = []
             for i, url in enumerate(self.urls):
+                if url not in state:
+                    continue
                 if (
                     state[url] is not None
                     and state[url]["status"] != "SUCCESS"
@@ -157,15 +259,10 @@ class TaskManager(object):
                 ):
                     continue
 
-                is_registered = self.rollback_register(url, task)
-                if not is_registered:
-                    yield self._error(critical="Invalid rollback schema.")
-                    return
+                self.rollback_register(url, task)
 
                 task_run_list.append(
-                    Task(
-                        url, task, output=self.outputs[i].copy(), verify=self.verify
-                    ).run()
+                    self._task_runner(url, task, self.outputs[i].copy()).run()
                 )
 
             results = await asyncio.gather(*task_run_list)
@@ -179,14 +276,204 @@ class TaskManager(object):
 
             yield results
 
-        for url in self.urls:
+        for url in state:
             if state[url]["status"] != "SUCCESS" and state[url]["ignore"] is False:
-                async for rollback in self.rollback_executor(url=url):
+                async for rollback in self.rollback_executor(url):
                     yield rollback
 
+    async def _url_pipeline(
+        self,
+        url: str,
+        queue: asyncio.Queue,
+        semaphore: Optional[asyncio.Semaphore] = None,
+    ):
+        """Run the scenario and its rollback on an URL, queueing the results."""
+        if semaphore is not None:
+            async with semaphore:
+                await self._url_pipeline(url, queue)
+            return
+
+        if self.scheduling == "dag":
+            await self._url_dag(url, queue)
+            return
+
+        index = self._output_index(url)
+        for task in self.plan:
+            self.rollback_register(url, task)
+
+            result = await self._task_runner(
+                url, task, self.outputs[index].copy()
+            ).run()
+
+            self.outputs[index] = result["output"]
+
+            await queue.put([result])
+            if result["status"] != "SUCCESS" and result["ignore"] is False:
+                async for rollback in self.rollback_executor(url):
+                    await queue.put(rollback)
+                break
+
+    async def _url_dag(self, url: str, queue: asyncio.Queue):
+        """Run the tasks of an URL as soon as their dependencies are done.
+
+        After a failure, no task is started anymore and the rollback of the
+        started tasks is run in the order of the scenario.
+        """
+        loop = asyncio.get_event_loop()
+        index = self._output_index(url)
+        tasks = self.plan.tasks
+        pending = list(range(len(tasks)))
+        running = {}
+        timings = {}
+        failed = False
+        while pending or running:
+            ready = [
+                task_index
+                for task_index in pending
+                if not failed and tasks[task_index].dependencies.issubset(timings)
+            ]
+            for task_index in ready:
+                pending.remove(task_index)
+                runner = self._task_runner(
+                    url, tasks[task_index], self.outputs[index].copy()
+                ).run()
+                running[asyncio.ensure_future(runner)] = (task_index, loop.time())
+            if not running:
+                break
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                task_index, start = running.pop(future)
+                timings[task_index] = (start, loop.time())
+                result = future.result()
+
+                output_variable = tasks[task_index].spec.get("output")
+                if output_variable and output_variable in result["output"]:
+                    self.outputs[index] = {
+                        **self.outputs[index],
+                        output_variable: result["output"][output_variable],
+                    }
+
+                await queue.put([result])
+                if result["status"] != "SUCCESS" and result["ignore"] is False:
+                    failed = True
+
+        self.critical_paths[url] = self._critical_path(timings)
+        if failed:
+            for task_index in sorted(timings):
+                self.rollback_register(url, tasks[task_index])
+            async for rollback in self.rollback_executor(url):
+                await queue.put(rollback)
+
+    def _critical_path(self, timings: dict) -> dict:
+        """Return the chain of dependencies ending with the last task done."""
+        path = []
+        candidates = timings.keys()
+        while candidates:
+            task_index = max(candidates, key=lambda candidate: timings[candidate][1])
+            path.append(task_index)
+            candidates = self.plan.tasks[task_index].dependencies & timings.keys()
+
+        path.reverse()
+        return {
+            "tasks": [
+                {"index": task_index, "name": self.plan.tasks[task_index].name}
+                for task_index in path
+            ],
+            "duration_sec": round(
+                sum(
+                    timings[task_index][1] - timings[task_index][0]
+                    for task_index in path
+                ),
+                2,
+            ),
+        }
+
+    async def _pipeline_executor(self) -> list:
+        """Private task executor, each URL running on its own.
+
+        At most `concurrency` URLs are run at once, if set.
+        """
+        if not self._validate_plan():
+            yield self._error(critical="Scenario validation failed.")
+            return
+
+        queue = asyncio.Queue()
+        semaphore = asyncio.Semaphore(self.concurrency) if self.concurrency else None
+        reachable_urls = set(self.reachable_urls)
+        pipelines = [
+            asyncio.ensure_future(self._url_pipeline(url, queue, semaphore))
+            for url in self.urls
+            if url in reachable_urls
+        ]
+        for pipeline in pipelines:
+            pipeline.add_done_callback(lambda _: queue.put_nowait(None))
+
+        try:
+            running = len(pipelines)
+            while running:
+                results = await queue.get()
+                if results is None:
+                    running -= 1
+                    continue
+                yield results
+
+            for pipeline in pipelines:
+                pipeline.result()
+        finally:
+            for pipeline in pipelines:
+                pipeline.cancel()
+
+    async def _preflight(self):
+        """Connect to every base URL within the request limits.
+
+        The unreachable URLs are excluded from the run, their connection
+        failures counting for the circuit breaker.
+        """
+        bases = {}
+        for url in self.urls:
+            bases.setdefault(base_url(url), url)
+
+        async def connect(url: str) -> dict:
+            error = None
+            await self.scheduler.throttle(url)
+            async with self.scheduler.slot(url):
+                start = time.monotonic()
+                try:
+                    await self.transport.warm_up(
+                        url, verify=self.verify, timeout=self.preflight_timeout
+                    )
+                except TransportError as e:
+                    error = str(e) or type(e).__name__
+            self.scheduler.record(url, error is not None)
+            return {
+                "reachable": error is None,
+                "duration_sec": round(time.monotonic() - start, 2),
+                "error": error,
+            }
+
+        checks = dict(
+            zip(bases, await asyncio.gather(*[connect(url) for url in bases.values()]))
+        )
+        self.preflights = {url: checks[base_url(url)] for url in self.urls}
+        for url, check in self.preflights.items():
+            if not check["reachable"]:
+                logger.error(f"Unreachable URL {url}: {check['error']}")
+        self.reachable_urls = [
+            url for url in self.urls if self.preflights[url]["reachable"]
+        ]
+
     async def _next(self) -> list:
         """Execute the next task."""
-        return await self.stack.__anext__()
+        if self.preflight and self.preflights is None:
+            self.preflights = {}
+            if not self.plan.errors:
+                await self._preflight()
+        try:
+            return await self.stack.__anext__()
+        except StopAsyncIteration:
+            await self.transport.close()
+            raise
 
     async def next(self) -> Union[str, list]:
         """Wrapper for better iterative output."""
@@ -196,14 +483,20 @@ class TaskManager(object):
         else:
             return result
 
-    async def run(self) -> bool:
-        """Run the whole task queue."""
+    async def run(self, on_result: Optional[Callable[[list], None]] = None) -> bool:
+        """Run the whole task queue.
+
+        `on_result` is called with the results of each step as soon as they
+        are available.
+        """
         results = []
         while True:
             try:
                 results.append(await self._next())
             except StopAsyncIteration:
                 break
+            if on_result is not None:
+                on_result([self._hide_token(result) for result in results[-1]])
 
         reports_per_url = {}
         for result in list(itertools.chain.from_iterable(results)):
@@ -213,6 +506,9 @@ class TaskManager(object):
                     reports_per_url[url] = []
                 reports_per_url[url].append(result)
 
+        self.stats["template_cache"] = template_cache.stats()
+
+        connection_stats = self.transport.connection_stats()
         self.all_reports = [
             {
                 "url": url,
@@ -220,9 +516,45 @@ class TaskManager(object):
                 "total_duration_sec": sum(
                     task["duration_sec"] or 0 for task in reports
                 ),
+                "total_queue_sec": round(
+                    sum(task.get("queue_sec", 0) for task in reports), 2
+                ),
+                "total_limiter_sec": round(
+                    sum(task.get("limiter_sec", 0) for task in reports), 2
+                ),
+                "connections": connection_stats.get(base_url(url)),
             }
             for url, reports in reports_per_url.items()
         ]
+        if self.scheduling == "dag":
+            for suite_report in self.all_reports:
+                suite_report["critical_path"] = self.critical_paths.get(
+                    suite_report["url"]
+                )
+        if self.scheduler.breaker is not None:
+            for suite_report in self.all_reports:
+                suite_report["circuit_open"] = self.scheduler.circuit_open(
+                    suite_report["url"]
+                )
+            summary = self.scheduler.breaker.summary()
+            if summary is not None:
+                logger.error(summary)
+        if self.preflight:
+            for suite_report in self.all_reports:
+                suite_report["preflight"] = self.preflights.get(suite_report["url"])
+            for url, check in self.preflights.items():
+                if not check["reachable"]:
+                    self.all_reports.append(
+                        {
+                            "url": url,
+                            "reports": [],
+                            "total_duration_sec": 0,
+                            "total_queue_sec": 0,
+                            "total_limiter_sec": 0,
+                            "connections": connection_stats.get(base_url(url)),
+                            "preflight": check,
+                        }
+                    )
         self._hide_token_from_all_reports(self.all_reports)
 
         if self.generate_report is not None:
@@ -235,7 +567,14 @@ class TaskManager(object):
                 for result in list(itertools.chain.from_iterable(results))
                 if result["ignore"] is False
             ]
-        )
+        ) and all(check["reachable"] for check in (self.preflights or {}).values())
+
+    @staticmethod
+    def _hide_token(result: dict) -> dict:
+        """Return the result with the token masked, the outputs being shared."""
+        if "__token__" not in result.get("output", {}):
+            return result
+        return {**result, "output": {**result["output"], "__token__": "***"}}  # nosec
 
     @staticmethod
     def _hide_token_from_all_reports(all_reports):
@@ -0,0 +1,158 @@
+"""Compiled comparison of response bodies."""
+
+from typing import Callable
+
+Matcher = Callable[[object], bool]
+
+
+# Types of the values that can be matched by equality of their canonical key.
+HASHABLE_TYPES = (str, int, float, bool)
+
+
+def _match_any(body) -> bool:
+    return True
+
+
+def canonical(value, types: set):
+    """Return a hashable key of a value, equal for values matching strictly.
+
+    `None` is returned for the values containing `None`, a list or a NaN,
+    which are matched item by item. The types of the leaves are added to
+    `types`, `object` standing for any other type.
+    """
+    value_type = type(value)
+    if value_type is dict:
+        items = []
+        for key, item in value.items():
+            item_key = canonical(item, types)
+            if item_key is None:
+                return None
+            items.append((key, item_key))
+        return (dict, frozenset(items))
+    if value_type in HASHABLE_TYPES:
+        types.add(value_type)
+        if value != value:
+            return None
+        return (value_type, value)
+    if value is not None and not isinstance(value, list):
+        types.add(object)
+    return None
+
+
+def compile_matcher(expected, match_mode: str = "strict") -> Matcher:
+    """Compile an expected body into a function matching a response body.
+
+    if expected value is None, any body is accepted.
+    if match_mode is "strict", the dicts must have the same keys and the
+        lists the same length, every body item matching an expected item.
+    if match_mode is "partial", the dicts must have at least the expected
+        keys, every expected list item matching a body item.
+    The matcher stops at the first mismatch.
+    """
+    if expected is None:
+        return _match_any
+
+    expected_type = type(expected)
+    strict = match_mode == "strict"
+
+    if isinstance(expected, dict):
+        keys = expected.keys()
+        children = tuple(
+            (key, compile_matcher(value, match_mode)) for key, value in expected.items()
+        )
+
+        def match_dict(body) -> bool:
+            if not isinstance(body, expected_type):
+                return False
+            if strict and body.keys() != keys:
+                return False
+            for key, matcher in children:
+                if key not in body or not matcher(body[key]):
+                    return False
+            return True
+
+        return match_dict
+
+    if isinstance(expected, list) and strict:
+        return _compile_strict_list(expected)
+
+    if isinstance(expected, list):
+        items = tuple(compile_matcher(item, match_mode) for item in expected)
+
+        def match_list(body) -> bool:
+            if not isinstance(body, expected_type):
+                return False
+            return all(any(item(value) for value in body) for item in items)
+
+        return match_list
+
+    def match_value(body) -> bool:
+        return isinstance(body, expected_type) and body == expected
+
+    return match_value
+
+
+def _compile_strict_list(expected: list) -> Matcher:
+    """Compile a strict list, every body item must match an expected item.
+
+    The fully specified expected items are looked up by their canonical key
+    in a set, the other ones (with `None` or lists) are matched one by one.
+    """
+    expected_type = type(expected)
+    size = len(expected)
+    keys = set()
+    keyed_items = []
+    other_items = []
+    expected_types = set()
+    for item in expected:
+        key = canonical(item, expected_types)
+        if key is None:
+            other_items.append(compile_matcher(item, "strict"))
+        else:
+            keys.add(key)
+            keyed_items.append(compile_matcher(item, "strict"))
+
+    def match_strict_list(body) -> bool:
+        if not isinstance(body, expected_type) or len(body) != size:
+            return False
+        for value in body:
+            value_types = set()
+            key = canonical(value, value_types)
+            if key is not None and key in keys:
+                continue
+            if any(item(value) for item in other_items):
+                continue
+            # A bool is an int, and values of other types may match too.
+            if object in value_types or (bool in value_types and int in expected_types):
+                if any(item(value) for item in keyed_items):
+                    continue
+            return False
+        return True
+
+    return match_strict_list
+
+
+class TaskMatchers(object):
+    """Matchers of the `expected`, `fail_on` and `until` bodies of a task.
+
+    The `until` body of a poll task is matched partially by default.
+    """
+
+    def __init__(self, task: dict):
+        """Initialization of `TaskMatchers` class."""
+        expected = task.get("expected", {})
+        self.body = self._compile(expected)
+        self.fail_on = tuple(
+            self._compile(fail_on) for fail_on in task.get("fail_on", [])
+        )
+        self.until = None
+        if "until" in task:
+            self.until = self._compile({"expected_match": "partial", **task["until"]})
+
+    @staticmethod
+    def _compile(definition: dict):
+        if not definition.get("body"):
+            return None
+        return compile_matcher(
+            definition["body"], definition.get("expected_match", "strict")
+        )
@@ -0,0 +1,248 @@
+"""Scenario compilation."""
+
+from typing import Dict, List, Optional
+
+from spintest.matcher import TaskMatchers
+from spintest.template import is_static, referenced_names, render_tree
+from spintest.validator import (
+    input_validator,
+    input_validator_e2e_task,
+    TASK_SCHEMA,
+)
+
+HTTP_METHODS = (
+    "GET",
+    "POST",
+    "PATCH",
+    "PUT",
+    "DELETE",
+    "HEAD",
+    "CONNECT",
+    "OPTIONS",
+    "TRACE",
+)
+
+DEFAULT_HEADERS = {"Accept": "application/json", "Content-Type": "application/json"}
+
+
+class CompiledTask(object):
+    """Validated task shared by every URL of a scenario.
+
+    The `spec` must not be modified, the runners work on a copy of it.
+    The keys of the `spec` without template syntax are marked as static
+    and are never rendered.
+    """
+
+    def __init__(
+        self,
+        spec: dict,
+        kind: str,
+        rollback: tuple = (),
+        error: Optional[str] = None,
+    ):
+        """Initialization of `CompiledTask` class."""
+        self.spec = spec
+        self.kind = kind
+        self.name = spec.get("name")
+        self.rollback = rollback
+        self.error = error
+        # Indexes of the tasks of the scenario this task waits for.
+        self.dependencies = frozenset()
+
+        self.static_nodes = set()
+        rendered_keys = ("target_input",) if kind == "e2e" else spec.keys()
+        self.templated_keys = tuple(
+            key
+            for key in rendered_keys
+            if key in spec and not is_static(spec[key], self.static_nodes)
+        )
+
+        # The matchers of templated bodies are compiled once rendered.
+        self.matchers = None
+        if (
+            kind in ("http_request", "poll")
+            and error is None
+            and not {"expected", "fail_on", "until"}.intersection(self.templated_keys)
+        ):
+            self.matchers = TaskMatchers(spec)
+
+    @property
+    def static(self) -> bool:
+        """Whether the task needs no rendering."""
+        return not self.templated_keys
+
+    def render(self, output: dict) -> dict:
+        """Return a copy of the `spec` with its templates rendered."""
+        task = dict(self.spec)
+        for key in self.templated_keys:
+            task[key] = render_tree(task[key], output, self.static_nodes)
+        return task
+
+    def __repr__(self):
+        return f"<CompiledTask {self.kind} {self.name or self.spec.get('route')}>"
+
+
+class ScenarioPlan(object):
+    """Immutable list of compiled tasks."""
+
+    def __init__(self, tasks: tuple, errors: tuple):
+        """Initialization of `ScenarioPlan` class."""
+        self.tasks = tasks
+        self.errors = errors
+
+    def __iter__(self):
+        return iter(self.tasks)
+
+    def __len__(self):
+        return len(self.tasks)
+
+
+def task_kind(task: dict) -> str:
+    """Return the runner kind of a task definition."""
+    if task.get("type") == "poll":
+        return "poll"
+    if task.get("target") is None or task.get("type") == "http_request":
+        return "http_request"
+    return "e2e"
+
+
+def compile_task(
+    task: dict, kind: Optional[str] = None, ignore: bool = False
+) -> CompiledTask:
+    """Validate a single task, without resolving its rollback."""
+    task = {key: value for key, value in task.items() if key != "rollback"}
+    kind = kind or task_kind(task)
+    if ignore:
+        task["ignore"] = True
+
+    if kind == "e2e":
+        try:
+            input_validator_e2e_task(task)
+        except ValueError as e:
+            return CompiledTask(task, kind, error=str(e))
+        return CompiledTask(task, kind)
+
+    task["type"] = kind
+    validated_task = input_validator(task, TASK_SCHEMA)
+    if not validated_task:
+        return CompiledTask(
+            task, kind, error=f"Task must follow this schema : {TASK_SCHEMA}."
+        )
+    if kind == "poll" and "until" not in validated_task:
+        return CompiledTask(
+            validated_task, kind, error="A poll task requires an 'until' condition."
+        )
+
+    validated_task["method"] = validated_task["method"].upper()
+    if validated_task["method"] not in HTTP_METHODS:
+        return CompiledTask(validated_task, kind, error="Invalid HTTP method.")
+
+    validated_task["headers"] = {**DEFAULT_HEADERS, **validated_task["headers"]}
+    return CompiledTask(validated_task, kind)
+
+
+def compile_scenario(tasks: List[Dict]) -> ScenarioPlan:
+    """Validate the tasks and resolve their rollback references once."""
+    named_tasks = {task["name"]: task for task in tasks if task.get("name")}
+    compiled_tasks = []
+    errors = []
+    for index, task in enumerate(tasks):
+        compiled_task = compile_task(task)
+        if compiled_task.error:
+            errors.append(
+                f"Task '{compiled_task.name or index}': {compiled_task.error}"
+            )
+
+        rollback = []
+        for rollback_task in task.get("rollback") or []:
+            if isinstance(rollback_task, str):
+                if rollback_task not in named_tasks:
+                    errors.append(f"Unknown rollback reference '{rollback_task}'.")
+                    continue
+                rollback_task = named_tasks[rollback_task]
+            elif not isinstance(rollback_task, dict):
+                errors.append(f"Invalid rollback schema: {rollback_task!r}.")
+                continue
+
+            compiled_rollback = compile_task(rollback_task, ignore=True)
+            if compiled_rollback.error:
+                errors.append(
+                    f"Rollback '{compiled_rollback.name or index}': "
+                    f"{compiled_rollback.error}"
+                )
+            rollback.append(compiled_rollback)
+
+        compiled_task.rollback = tuple(rollback)
+        compiled_tasks.append(compiled_task)
+
+    errors.extend(resolve_dependencies(compiled_tasks))
+    return ScenarioPlan(tuple(compiled_tasks), tuple(errors))
+
+
+def resolve_dependencies(tasks: List[CompiledTask]) -> List[str]:
+    """Set the dependencies of the tasks and return the errors found.
+
+    A task depends on the tasks named in its `depends_on`, on the last
+    previous task setting an output it references, and on the previous
+    tasks reading or setting its own output.
+    """
+    errors = []
+    named_tasks = {task.name: index for index, task in enumerate(tasks) if task.name}
+    writers = {}
+    readers = {}
+    for index, task in enumerate(tasks):
+        dependencies = set()
+        depends_on = task.spec.get("depends_on") or []
+        for name in depends_on if isinstance(depends_on, list) else [depends_on]:
+            if name not in named_tasks:
+                errors.append(
+                    f"Task '{task.name or index}': unknown dependency {name!r}."
+                )
+                continue
+            dependencies.add(named_tasks[name])
+
+        references = set().union(
+            *[referenced_names(task.spec[key]) for key in task.templated_keys]
+        )
+        dependencies.update(writers[name] for name in references if name in writers)
+
+        output = task.spec.get("output")
+        if output:
+            dependencies.update(readers.pop(output, []))
+            if output in writers:
+                dependencies.add(writers[output])
+            writers[output] = index
+        for name in references:
+            readers.setdefault(name, []).append(index)
+
+        dependencies.discard(index)
+        task.dependencies = frozenset(dependencies)
+
+    cycle = _cycle(tasks)
+    if cycle:
+        names = " -> ".join(f"'{tasks[index].name or index}'" for index in cycle)
+        errors.append(f"Dependency cycle between the tasks {names}.")
+    return errors
+
+
+def _cycle(tasks: List[CompiledTask]) -> List[int]:
+    """Return the indexes of a dependency cycle, empty if there is none."""
+    visited, path = set(), []
+
+    def visit(index: int) -> bool:
+        if index in path:
+            del path[: path.index(index)]
+            return True
+        if index in visited:
+            return False
+        visited.add(index)
+        path.append(index)
+        if any(visit(dependency) for dependency in sorted(tasks[index].dependencies)):
+            return True
+        path.pop()
+        return False
+
+    for index in range(len(tasks)):
+        if visit(index):
+            return path
+    return []
@@ -0,0 +1,112 @@
+"""Polling task representation."""
+
+import asyncio
+import time
+
+from urllib.parse import urljoin
+
+from spintest.task import Task
+from spintest.transport import TransportError
+
+DEFAULT_INTERVAL = 0.1
+DEFAULT_BACKOFF = 1.5
+DEFAULT_MAX_INTERVAL = 5.0
+DEFAULT_TIMEOUT = 60.0
+
+
+class PollTask(Task):
+    """Polling task handler.
+
+    The request is sent again until the response meets the `until`
+    condition, the interval between two polls starting at `interval` and
+    growing by `backoff` up to `max_interval`. Once the condition is met,
+    the response is validated like the one of a `Task`. The task times out
+    if the condition is not met after `timeout` seconds.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Initialization of `PollTask` class."""
+        super().__init__(*args, **kwargs)
+        self.time_to_condition = None
+
+    def _report_fields(self) -> dict:
+        return {
+            "polls": self.attempts,
+            "time_to_condition_sec": (
+                None
+                if self.time_to_condition is None
+                else round(self.time_to_condition, 2)
+            ),
+        }
+
+    def _condition(self):
+        """Return whether the response meets the `until` condition.
+
+        The body is matched like the `expected` body, partially by default,
+        with the matcher compiled once per scenario (or per run if templated).
+        Without a code, the response must be successful (2XX).
+        """
+        until = self.task["until"]
+        matcher = self.matchers.until
+
+        def condition() -> bool:
+            code = self._response_code()
+            if "code" in until:
+                if code != until["code"]:
+                    return False
+            elif not 200 <= code < 300:
+                return False
+            return matcher is None or matcher(self._response_body())
+
+        return condition
+
+    async def _run(self) -> dict:
+        failed_response = self._prepare()
+        if failed_response is not None:
+            return failed_response
+
+        poll = self.task.get("poll", {})
+        interval = poll.get("interval", DEFAULT_INTERVAL)
+        condition = self._condition()
+
+        start_time = self.start_time = time.monotonic()
+        end_time = start_time + poll.get("timeout", DEFAULT_TIMEOUT)
+        while True:
+            self.attempts += 1
+            try:
+                await self._send()
+            except TransportError:
+                self.response = None
+            self.task["duration_sec"] = self._duration(start_time)
+
+            if self.response is None and self.scheduler.circuit_open(
+                urljoin(self.url, self.task["route"])
+            ):
+                return self._response("FAILED", "Request failed.")
+
+            if self.response is not None:
+                output_variable = self.task.get("output")
+                if output_variable:
+                    self.output[output_variable] = self._response_body()
+
+                failed_response = (
+                    self.validate_fail_on_code() or self.validate_fail_on_body()
+                )
+                if failed_response is not None:
+                    return failed_response
+
+                if condition():
+                    self.time_to_condition = time.monotonic() - start_time
+                    failed_response = self.validate_code() or self.validate_body()
+                    return failed_response or self._response("SUCCESS", "OK.")
+
+            remaining = end_time - time.monotonic()
+            if remaining <= 0:
+                return self._response(
+                    "TIMEOUT", "The condition was not met before the poll timeout."
+                )
+            await asyncio.sleep(min(interval, remaining))
+            interval = min(
+                interval * poll.get("backoff", DEFAULT_BACKOFF),
+                poll.get("max_interval", DEFAULT_MAX_INTERVAL),
+            )
@@ -0,0 +1,49 @@
+"""Retry policy of the tasks."""
+
+import random
+import time
+
+from email.utils import parsedate_to_datetime
+from typing import Optional, Union
+
+# Failure of an attempt: the unexpected status code, "body" for an unexpected
+# body, "error" if the request failed and "timeout" if it timed out.
+Reason = Union[int, str]
+
+
+def retriable(task: dict, reason: Reason) -> bool:
+    """Tell whether a failure is retried, every one being without `retry_on`."""
+    retry_on = task.get("retry_on")
+    return retry_on is None or reason in retry_on
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a `Retry-After` header, in seconds or a date."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(date.timestamp() - time.time(), 0.0)
+
+
+def retry_delay(task: dict, attempt: int, retry_after: Optional[float] = None) -> float:
+    """Delay before the retry following the attempt `attempt` (from 0).
+
+    The `delay` is multiplied by `backoff` at each attempt, bounded by
+    `max_delay`, and reduced by a random part of up to `jitter` of it.
+    A `Retry-After` delay is waited at least, if the task respects it.
+    """
+    delay = task["delay"] * task.get("backoff", 1) ** attempt
+    if task.get("max_delay") is not None:
+        delay = min(delay, task["max_delay"])
+    if task.get("jitter"):
+        delay -= delay * task["jitter"] * random.random()  # nosec
+    if retry_after is not None and task.get("retry_after"):
+        delay = max(delay, retry_after)
+    return delay
@@ -0,0 +1,214 @@
+"""Scheduling of the requests sent by the tasks."""
+
+import asyncio
+import time
+
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from spintest.transport import base_url
+
+
+class TokenBucket(object):
+    """Token bucket allowing `rate` requests per second, `burst` at once.
+
+    The tokens are reserved in call order, a bucket can go into debt and
+    each caller sleeps until its own token is available.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        """Initialization of `TokenBucket` class."""
+        if rate <= 0:
+            raise ValueError("The rate limit must be positive.")
+        if burst < 1:
+            raise ValueError("The rate burst must be at least 1.")
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take a token, return the time to wait before using it."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(-self.tokens / self.rate, 0.0)
+
+    async def acquire(self) -> float:
+        """Wait for a token, return the time waited."""
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class CircuitBreaker(object):
+    """Open the circuit of a base URL after consecutive connection failures.
+
+    Once open, the circuit stays open for the rest of the run and the tasks
+    of the base URL are skipped.
+    """
+
+    def __init__(self, threshold: int):
+        """Initialization of `CircuitBreaker` class."""
+        if threshold < 1:
+            raise ValueError("The circuit breaker threshold must be at least 1.")
+        self.threshold = threshold
+        self.failures = {}
+        self.skipped = {}
+
+    def is_open(self, url: str) -> bool:
+        return self.failures.get(base_url(url), 0) >= self.threshold
+
+    def record(self, url: str, failed: bool):
+        """Record whether a request failed to get a response."""
+        if self.is_open(url):
+            return
+        base = base_url(url)
+        self.failures[base] = self.failures.get(base, 0) + 1 if failed else 0
+
+    def skip(self, url: str):
+        """Count a task skipped, its circuit being open."""
+        base = base_url(url)
+        self.skipped[base] = self.skipped.get(base, 0) + 1
+
+    def summary(self) -> Optional[str]:
+        """One line describing the open circuits, `None` if none is."""
+        opened = [base for base in self.failures if self.is_open(base)]
+        if not opened:
+            return None
+        return (
+            f"Circuit open for {len(opened)} base URLs after {self.threshold} "
+            f"consecutive connection failures, tasks skipped: "
+            + ", ".join(f"{base} ({self.skipped.get(base, 0)})" for base in opened)
+            + "."
+        )
+
+
+class RequestScheduler(object):
+    """Bound the requests in flight and their rate.
+
+    The requests in flight are bounded in total and per host, the semaphores
+    being created on first use, in the running event loop. The rate is
+    limited in total, per base URL and per route of the scenario.
+    With a `breaker_threshold`, a circuit breaker skips the requests to the
+    base URLs that failed that many times in a row.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: Optional[int] = None,
+        max_per_host: Optional[int] = None,
+        rate_limit: Optional[float] = None,
+        url_rate_limit: Optional[float] = None,
+        route_rate_limits: Optional[Dict[str, float]] = None,
+        rate_burst: int = 1,
+        breaker_threshold: Optional[int] = None,
+    ):
+        """Initialization of `RequestScheduler` class."""
+        for name, limit in (
+            ("max_in_flight", max_in_flight),
+            ("max_per_host", max_per_host),
+        ):
+            if limit is not None and limit < 1:
+                raise ValueError(f"The {name} limit must be at least 1.")
+        self.max_in_flight = max_in_flight
+        self.max_per_host = max_per_host
+        self.in_flight = None
+        self.hosts = {}
+
+        self.rate_limit = rate_limit
+        self.url_rate_limit = url_rate_limit
+        self.route_rate_limits = route_rate_limits or {}
+        self.rate_burst = rate_burst
+        self.buckets = {}
+        rates = [rate_limit, url_rate_limit, *self.route_rate_limits.values()]
+        if any(rate is not None and rate <= 0 for rate in rates):
+            raise ValueError("The rate limits must be positive.")
+        if rate_burst < 1:
+            raise ValueError("The rate burst must be at least 1.")
+        self.rate_limited = any(rate is not None for rate in rates)
+
+        self.breaker = None
+        if breaker_threshold is not None:
+            self.breaker = CircuitBreaker(breaker_threshold)
+
+    def circuit_open(self, url: str) -> bool:
+        """Whether the requests to the base URL of `url` are skipped."""
+        return self.breaker is not None and self.breaker.is_open(url)
+
+    def record(self, url: str, failed: bool):
+        """Record whether a request failed at the connection level."""
+        if self.breaker is not None:
+            self.breaker.record(url, failed)
+
+    def skip(self, url: str):
+        """Count a task skipped by the circuit breaker."""
+        if self.breaker is not None:
+            self.breaker.skip(url)
+
+    def _bucket(self, key, rate: float) -> TokenBucket:
+        if key not in self.buckets:
+            self.buckets[key] = TokenBucket(rate, self.rate_burst)
+        return self.buckets[key]
+
+    def _buckets(self, url: str, route: Optional[str]) -> list:
+        """Return the token buckets of a request, the most specific first."""
+        buckets = []
+        if not self.rate_limited:
+            return buckets
+        base = base_url(url)
+        if route in self.route_rate_limits:
+            rate = self.route_rate_limits[route]
+            buckets.append(self._bucket((base, route), rate))
+        if self.url_rate_limit is not None:
+            buckets.append(self._bucket(base, self.url_rate_limit))
+        if self.rate_limit is not None:
+            buckets.append(self._bucket(None, self.rate_limit))
+        return buckets
+
+    async def throttle(self, url: str, route: Optional[str] = None) -> float:
+        """Wait for the rate limits of a request, return the time waited.
+
+        `route` is the route of the task as defined in the scenario, before
+        rendering. The global token is taken last, once the request is only
+        waiting for it.
+        """
+        waited = 0.0
+        for bucket in self._buckets(url, route):
+            waited += await bucket.acquire()
+        return waited
+
+    def _semaphores(self, url: str) -> list:
+        """Return the semaphores of an URL, the host one first."""
+        semaphores = []
+        if self.max_per_host is not None:
+            host = urlsplit(url).netloc
+            if host not in self.hosts:
+                self.hosts[host] = asyncio.Semaphore(self.max_per_host)
+            semaphores.append(self.hosts[host])
+        if self.max_in_flight is not None:
+            if self.in_flight is None:
+                self.in_flight = asyncio.Semaphore(self.max_in_flight)
+            semaphores.append(self.in_flight)
+        return semaphores
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """Wait for a free slot to send a request, yield the time waited.
+
+        The host slot is taken before the global one, so that a request
+        waiting for its host does not hold a global slot.
+        """
+        start = time.monotonic()
+        acquired = []
+        try:
+            for semaphore in self._semaphores(url):
+                await semaphore.acquire()
+                acquired.append(semaphore)
+            yield time.monotonic() - start
+        finally:
+            for semaphore in reversed(acquired):
+                semaphore.release()
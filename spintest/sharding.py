@@ -0,0 +1,145 @@
+"""Execution of the URLs split across a pool of processes."""
+
+import asyncio
+import itertools
+import json
+import os
+import pickle  # nosec
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Union
+
+from spintest.manager import TaskManager
+
+
+def split(urls: List[str], shards: int) -> List[List[str]]:
+    """Split the URLs into at most `shards` contiguous lists of close sizes."""
+    shards = max(min(shards, len(urls)), 1)
+    size, remainder = divmod(len(urls), shards)
+    result, start = [], 0
+    for index in range(shards):
+        end = start + size + (1 if index < remainder else 0)
+        result.append(urls[start:end])
+        start = end
+    return [shard for shard in result if shard]
+
+
+def shard_options(options: dict, shards: int) -> dict:
+    """Split the limits of the whole run across `shards` shards.
+
+    The rates are divided by the number of shards, and so are the bounds on
+    the requests in flight, rounded down.
+    """
+    options = dict(options)
+    for name in ("rate_limit", "url_rate_limit"):
+        if options.get(name) is not None:
+            options[name] = options[name] / shards
+    if options.get("route_rate_limits"):
+        options["route_rate_limits"] = {
+            route: rate / shards for route, rate in options["route_rate_limits"].items()
+        }
+    for name in ("max_in_flight", "max_per_host"):
+        if options.get(name) is not None:
+            options[name] = options[name] // shards
+    return options
+
+
+def run_shard(urls: List[str], tasks: List[Dict], options: dict) -> tuple:
+    """Run a `TaskManager` on some URLs in its own event loop.
+
+    Return the result of the run, its reports and its statistics.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        manager = TaskManager(urls, tasks, **options)
+        result = loop.run_until_complete(manager.run())
+    finally:
+        loop.close()
+    return result, manager.all_reports, manager.stats
+
+
+def merge_stats(stats: List[dict]) -> dict:
+    """Sum the statistics of the shards."""
+    merged = {}
+    for shard_stats in stats:
+        for key, value in shard_stats.items():
+            if isinstance(value, dict):
+                merged[key] = merge_stats([merged.get(key, {}), value])
+            else:
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+class ShardedTaskManager(object):
+    """Task manager running the URLs split across a pool of processes.
+
+    Each process runs a `TaskManager` on a shard of the URLs, in its own
+    event loop, and the reports are merged in the order of the URLs.
+    The tasks, the token and the options must be picklable, the E2E
+    targets and the token functions being defined at module level.
+
+    The rate limits and the bounds on the requests in flight apply to the
+    whole run: they are split across the shards, and there are no more
+    shards than allowed requests in flight.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        tasks: List[Dict[str, str]],
+        token: Union[str, Callable[..., str], None] = None,
+        processes: Optional[int] = None,
+        generate_report: Optional[str] = None,
+        **kwargs,
+    ):
+        """Initialization of `ShardedTaskManager` class.
+
+        Extra keyword arguments are passed to the `TaskManager` of each
+        shard.
+        """
+        try:
+            pickle.dumps(token)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            raise ValueError(
+                "The token must be picklable, a token function being defined at "
+                "module level."
+            ) from None
+        self.urls = urls
+        self.tasks = tasks
+        self.token = token
+        self.processes = processes or os.cpu_count() or 1
+        self.generate_report = generate_report
+        self.options = {"token": token, **kwargs}
+        self.all_reports = []
+        self.stats = {}
+
+    async def run(self) -> bool:
+        """Run the shards in the process pool and merge their reports."""
+        bounds = [
+            self.options[name]
+            for name in ("max_in_flight", "max_per_host")
+            if self.options.get(name) is not None
+        ]
+        shards = split(self.urls, min([self.processes, *bounds]))
+        shard_results = []
+        if shards:
+            options = shard_options(self.options, len(shards))
+            loop = asyncio.get_event_loop()
+            with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+                shard_results = await asyncio.gather(
+                    *[
+                        loop.run_in_executor(pool, run_shard, urls, self.tasks, options)
+                        for urls in shards
+                    ]
+                )
+
+        self.all_reports = list(
+            itertools.chain.from_iterable(reports for _, reports, _ in shard_results)
+        )
+        self.stats = merge_stats([stats for _, _, stats in shard_results])
+
+        if self.generate_report is not None:
+            with open(self.generate_report, "w", encoding="utf-8") as file:
+                json.dump(self.all_reports, file, ensure_ascii=False)
+
+        return all(result for result, _, _ in shard_results)
@@ -1,70 +1,179 @@
 """Task representation."""
 
 import asyncio
+import copy
 
-import jinja2
 import json
-import requests
+import logging
 import time
 
+from typing import Optional, Union
 from urllib.parse import urljoin
 
 from spintest import logger
-from spintest.validator import input_validator, TASK_SCHEMA
-from spintest.types import type_aware_encoder
+from spintest.matcher import compile_matcher, TaskMatchers
+from spintest.plan import CompiledTask, compile_task
+from spintest.retry import Reason, parse_retry_after, retriable, retry_delay
+from spintest.scheduler import RequestScheduler
+from spintest.transport import (
+    Timeout,
+    TransportError,
+    TransportTimeout,
+    as_response,
+    get_transport,
+)
 
 
 class Task(object):
-    """Task handler."""
-
-    def __init__(self, url: str, task: dict, output: dict, verify: bool = True):
+    """Task handler.
+
+    A task still running at the `deadline`, a `time.monotonic()` value, is
+    cancelled with the `TIMEOUT` status.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        task: Union[dict, CompiledTask],
+        output: dict,
+        verify: bool = True,
+        transport=None,
+        scheduler: Optional[RequestScheduler] = None,
+        deadline: Optional[float] = None,
+    ):
         """Initialization of `Task` class."""
         self.url = url
-        self.task = task
-        self.rollback = self.task.pop("rollback", None)
+        if not isinstance(task, CompiledTask):
+            task = compile_task(task, kind="http_request")
+        self.compiled_task = task
+        self.task = dict(task.spec)
+        self.rollback = task.rollback
+        self.matchers = task.matchers
         self.output = output
         self.verify = verify
+        # A transport created for the task alone is closed after its run.
+        self.owns_transport = transport is None
+        self.transport = get_transport(transport)
+        self.scheduler = scheduler or RequestScheduler()
+        self.deadline = deadline
+        self.start_time = None
         self.response = None
+        self.decode_body = self.task.get("decode_body", True)
+        self.queue_sec = 0.0
+        self.limiter_sec = 0.0
+        self.attempts = 0
+        # Latency of the request of each attempt, without and with the waits
+        # for the request limits.
+        self.attempt_latencies = []
 
     def _response(self, status: str, message: str) -> dict:
-        """Return the response with logging."""
+        """Return the response with logging.
+
+        The report gets its own copy of the task, whose static parts are
+        shared with the compiled scenario.
+        """
+        if "headers" in self.task and "Authorization" in self.task["headers"]:
+            self.task["headers"] = {**self.task["headers"], "Authorization": "****"}
+
         result = {
             "name": self.task.get("name"),
             "status": status,
             "timestamp": time.asctime(),
             "duration_sec": self.task.get("duration_sec", None),
+            "queue_sec": round(self.queue_sec, 2),
+            "limiter_sec": round(self.limiter_sec, 2),
+            "attempts": self.attempts,
+            **self._report_fields(),
             "url": self.url,
             "route": self.task.get("route", "/"),
             "message": message,
             "code": self._response_code(),
-            "body": self._response_body(),
-            "task": self.task,
+            "body": self._response_body() if self.decode_body else None,
+            "task": copy.deepcopy(self.task),
             "ignore": self.task.get("ignore", False),
         }
-        if "headers" in self.task and "Authorization" in self.task["headers"]:
-            self.task["headers"]["Authorization"] = "****"
 
-        log_level = {"SUCCESS": logger.info, "FAILED": logger.error}
-        log_level.get(status, logger.critical)(json.dumps(result, indent=4))
+        log_level = {
+            "SUCCESS": logging.INFO,
+            "FAILED": logging.ERROR,
+            "TIMEOUT": logging.ERROR,
+            # Summarized by the task manager.
+            "SKIPPED": logging.DEBUG,
+        }.get(status, logging.CRITICAL)
+        if logger.isEnabledFor(log_level):
+            logger.log(log_level, json.dumps(result, indent=4))
 
         result["output"] = self.output
         return result
 
+    def _report_fields(self) -> dict:
+        """Fields of the report specific to the kind of task."""
+        return {}
+
+    def _duration(self, start_time: float) -> float:
+        """Duration of the task since its start, without the waits to send."""
+        waited = self.queue_sec + self.limiter_sec
+        return round(time.monotonic() - start_time - waited, 2)
+
+    def _timeout(self) -> Timeout:
+        """Connect and read timeouts of the request, bounded by the deadline."""
+        timeout = self.task.get("timeout")
+        if isinstance(timeout, dict):
+            connect, read = timeout.get("connect"), timeout.get("read")
+        else:
+            connect = read = timeout
+        if self.deadline is not None:
+            # The request must not outlive the task, even in an executor thread.
+            remaining = max(self.deadline - time.monotonic(), 0.001)
+            connect = remaining if connect is None else min(connect, remaining)
+            read = remaining if read is None else min(read, remaining)
+        if connect is None and read is None:
+            return None
+        return connect, read
+
+    async def _retry(self, reason: Reason) -> bool:
+        """Wait before retrying a failed attempt, tell whether to retry.
+
+        The retries stop once a retry would end after `retry_timeout`, or
+        once the circuit of the base URL is open.
+        """
+        if self.attempts > self.task["retry"] or not retriable(self.task, reason):
+            return False
+        if self.scheduler.circuit_open(urljoin(self.url, self.task["route"])):
+            return False
+        retry_after = None
+        if isinstance(reason, int) and self.response is not None:
+            retry_after = parse_retry_after(self.response.headers.get("Retry-After"))
+        delay = retry_delay(self.task, self.attempts - 1, retry_after)
+        retry_timeout = self.task.get("retry_timeout")
+        if (
+            retry_timeout is not None
+            and time.monotonic() - self.start_time + delay > retry_timeout
+        ):
+            return False
+        await asyncio.sleep(delay)
+        return True
+
     def _response_code(self):
         """Response code formatter."""
-        try:
-            return self.response.status_code
-        except AttributeError:
+        if self.response is None:
             return None
+        return self.response.status_code
 
     def _response_body(self):
-        """Response body formatter."""
-        try:
-            return self.response.json()
-        except ValueError:
-            return self.response.text
-        except AttributeError:
+        """Response body formatter, decoded once per response."""
+        if self.response is None:
             return None
+        return self.response.body
+
+    def _needs_body(self) -> bool:
+        """Whether the validators or the output of the task need the body."""
+        return bool(
+            self.task.get("output")
+            or self.matchers.body is not None
+            or self.matchers.until is not None
+            or any(matcher is not None for matcher in self.matchers.fail_on)
+        )
 
     def validate_code(self):
         """Validate the returned status code."""
@@ -77,65 +186,13 @@ class Task(object):
             return self._response("FAILED", "Invalid default HTTP status code (2XX).")
 
     def _compare_body(self, body, expected, match_mode):
-        """Recursive comparison of body.
-        if expected value is None, any body is accepted.
-        if expected value is set, and expect_match value is not set,
-            strict comparison is made.
-        if expected value is set, and expect_match value is set to "partial",
-            partial comparison is made.
-        if expected and body keys are different, returns false.
-        """
-        if expected is None:
-            return True
-
-        if not isinstance(body, type(expected)):
-            return False
-
-        if isinstance(body, dict):
-            if match_mode == "strict" and body.keys() != expected.keys():
-                return False
-
-            if not set(expected).issubset(body):
-                return False
-
-            return all(
-                [
-                    self._compare_body(body[ek], expected[ek], match_mode)
-                    for ek in expected.keys()
-                ]
-            )
-
-        elif isinstance(body, list):
-            if match_mode == "strict":
-                if len(body) != len(expected):
-                    return False
-                for body_item in body:
-                    for expected_item in expected:
-                        if self._compare_body(body_item, expected_item, match_mode):
-                            break
-                    else:
-                        return False
-            else:
-                for expected_item in expected:
-                    for body_item in body:
-                        if self._compare_body(body_item, expected_item, match_mode):
-                            break
-                    else:
-                        return False
-            return True
-
-        else:
-            if body == expected:
-                return True
-            return False
+        """Comparison of body, see `spintest.matcher.compile_matcher`."""
+        return compile_matcher(expected, match_mode)(body)
 
     def validate_body(self):
         """Validate the returned body."""
-        expected_body = self.task.get("expected", {}).get("body")
-        response_body = self._response_body()
-        match_mode = self.task.get("expected", {}).get("expected_match", "strict")
-        if expected_body and not self._compare_body(
-            response_body, expected_body, match_mode
+        if self.matchers.body is not None and not self.matchers.body(
+            self._response_body()
         ):
             return self._response(
                 "FAILED",
@@ -154,82 +211,115 @@ class Task(object):
 
     def validate_fail_on_body(self):
         """Verify if the response body is not in the fail_on definition."""
-        fail_on_list = self.task.get("fail_on", [])
-        for fail_on in fail_on_list:
-            body = fail_on.get("body")
-            match_mode = fail_on.get("expected_match", "strict")
-            response_body = self._response_body()
-            if body and self._compare_body(response_body, body, match_mode):
+        for matcher in self.matchers.fail_on:
+            if matcher is not None and matcher(self._response_body()):
                 return self._response(
                     "FAILED",
                     "The response body correspond with the fail_on body.",
                 )
 
     async def run(self) -> dict:
-        """Run the task on a specified URL."""
+        """Run the task on a specified URL, until its deadline if any."""
+        try:
+            return await self._run_until_deadline()
+        finally:
+            if self.owns_transport:
+                await self.transport.close()
+
+    async def _run_until_deadline(self) -> dict:
+        if self.deadline is None:
+            return await self._run()
+        try:
+            return await asyncio.wait_for(
+                self._run(), max(self.deadline - time.monotonic(), 0)
+            )
+        except asyncio.TimeoutError:
+            if self.start_time is not None:
+                self.task["duration_sec"] = self._duration(self.start_time)
+            return self._response("TIMEOUT", "Deadline exceeded.")
 
-        # -- Input validation --
+    def _prepare(self) -> Optional[dict]:
+        """Render the task, return the failed response if it is invalid."""
 
-        validated_task = input_validator(self.task, TASK_SCHEMA)
-        if not validated_task:
-            return self._response(
-                "FAILED", f"Task must follow this schema : {TASK_SCHEMA}."
-            )
+        # -- Input validation --
 
-        self.task = validated_task
-
-        self.task["method"] = self.task["method"].upper()
-        if self.task["method"] not in [
-            "GET",
-            "POST",
-            "PATCH",
-            "PUT",
-            "DELETE",
-            "HEAD",
-            "CONNECT",
-            "OPTIONS",
-            "TRACE",
-        ]:
-            return self._response("FAILED", "Invalid HTTP method.")
+        if self.compiled_task.error:
+            return self._response("FAILED", self.compiled_task.error)
 
         # Jinja2 logic substitution
-        template = jinja2.Template(
-            json.dumps(self.task, cls=type_aware_encoder(self.output))
+        if not self.compiled_task.static:
+            self.task = self.compiled_task.render(self.output)
+        self.task["headers"] = dict(self.task["headers"])
+        if self.matchers is None:
+            self.matchers = TaskMatchers(self.task)
+        # Without `decode_body`, the body is kept raw unless it is needed.
+        self.decode_body = self.task.get("decode_body", True) or self._needs_body()
+
+        url = urljoin(self.url, self.task["route"])
+        if self.scheduler.circuit_open(url):
+            self.scheduler.skip(url)
+            return self._response("SKIPPED", "Circuit open for the base URL.")
+
+    async def _send(self):
+        """Send the request of an attempt, within the request limits."""
+        attempt_start = time.monotonic()
+        if self.output.get("__token__"):
+            token = self.output["__token__"]
+            self.task["headers"]["Authorization"] = "Bearer " + (
+                token() if callable(token) else token
+            )
+        url = urljoin(self.url, self.task["route"])
+        self.limiter_sec += await self.scheduler.throttle(
+            url, self.compiled_task.spec.get("route")
         )
-        self.task = json.loads(template.render(**self.output))
+        async with self.scheduler.slot(url) as queue_sec:
+            self.queue_sec += queue_sec
+            request_start = time.monotonic()
+            try:
+                response = await self.transport.request(
+                    self.task["method"],
+                    url,
+                    body=self.task.get("body"),
+                    headers=self.task["headers"],
+                    verify=self.verify,
+                    timeout=self._timeout(),
+                )
+                self.response = as_response(response)
+            except TransportError:
+                self.scheduler.record(url, failed=True)
+                raise
+            finally:
+                end = time.monotonic()
+                self.attempt_latencies.append(
+                    (end - request_start, end - attempt_start)
+                )
+        self.scheduler.record(url, failed=False)
 
-        self.task["headers"] = {
-            **{"Accept": "application/json", "Content-Type": "application/json"},
-            **self.task.get("headers", {}),
-        }
+    async def _run(self) -> dict:
+        failed_response = self._prepare()
+        if failed_response is not None:
+            return failed_response
 
         # -- Request --
 
-        loop = asyncio.get_event_loop()
-
-        start_time = time.monotonic()
-        for _ in range(self.task["retry"] + 1):
+        start_time = self.start_time = time.monotonic()
+        while True:
+            self.attempts += 1
             try:
-                if self.output.get("__token__"):
-                    token = self.output["__token__"]
-                    self.task["headers"]["Authorization"] = "Bearer " + (
-                        token() if callable(token) else token
-                    )
-                self.response = await loop.run_in_executor(
-                    None,
-                    lambda: getattr(requests, self.task["method"].lower())(
-                        urljoin(self.url, self.task["route"]),
-                        json=self.task.get("body"),
-                        headers=self.task["headers"],
-                        verify=self.verify,
-                    ),
-                )
-                self.task["duration_sec"] = round(time.monotonic() - start_time, 2)
-            except requests.exceptions.RequestException:
-                self.task["duration_sec"] = round(time.monotonic() - start_time, 2)
+                await self._send()
+                self.task["duration_sec"] = self._duration(start_time)
+            except TransportTimeout:
+                self.task["duration_sec"] = self._duration(start_time)
+                failed_response = self._response("TIMEOUT", "Request timed out.")
+                if await self._retry("timeout"):
+                    continue
+                return failed_response
+            except TransportError:
+                self.task["duration_sec"] = self._duration(start_time)
                 failed_response = self._response("FAILED", "Request failed.")
-                await asyncio.sleep(self.task["delay"])
-                continue
+                if await self._retry("error"):
+                    continue
+                return failed_response
 
             # -- Output validation --
 
@@ -243,8 +333,9 @@ class Task(object):
 
             failed_response = self.validate_code()
             if failed_response is not None:
-                await asyncio.sleep(self.task["delay"])
-                continue
+                if await self._retry(self._response_code()):
+                    continue
+                return failed_response
 
             failed_response = self.validate_fail_on_body()
             if failed_response is not None:
@@ -252,9 +343,8 @@ class Task(object):
 
             failed_response = self.validate_body()
             if failed_response is not None:
-                await asyncio.sleep(self.task["delay"])
-                continue
+                if await self._retry("body"):
+                    continue
+                return failed_response
 
             return self._response("SUCCESS", "OK.")
-
-        return failed_response
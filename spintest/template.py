@@ -0,0 +1,324 @@
+"""Template rendering shared by the tasks."""
+
+import jinja2
+import re
+
+from jinja2 import meta
+
+from collections import OrderedDict
+from typing import Optional
+
+WHOLE_EXPRESSION = re.compile(r"^\s*\{\{(.*)\}\}\s*$", re.DOTALL)
+TEMPLATE_TAGS = ("{{", "}}", "{%", "%}", "{#", "#}")
+
+INTERPOLATION = re.compile(r"\{\{(.*?)\}\}", re.DOTALL)
+PATH_NAME = re.compile(r"\s*([A-Za-z_][A-Za-z0-9_]*)")
+PATH_STEP = re.compile(
+    r"""\s*(?:
+        \.\s*(?P<attribute>[A-Za-z_][A-Za-z0-9_]*)
+        | \.(?P<index>\d+)
+        | \[\s*(?:'(?P<single>[^'\\]*)'|"(?P<double>[^"\\]*)"|(?P<number>-?\d+))\s*\]
+    )""",
+    re.VERBOSE,
+)
+# Names that Jinja parses as constants instead of variables.
+JINJA_CONSTANTS = ("true", "false", "none", "True", "False", "None")
+# Jinja turns the "\r\n" and "\r" newlines of a template into "\n", so the
+# carriage returns are replaced by a noncharacter while rendering.
+CARRIAGE_RETURN = "\uffff"
+
+
+class TemplateCache(object):
+    """Bounded LRU cache of compiled templates keyed by their source text."""
+
+    def __init__(
+        self, environment: jinja2.Environment, maxsize: int = 1024, compiler=None
+    ):
+        """Initialization of `TemplateCache` class."""
+        self.environment = environment
+        self.compiler = compiler or environment.from_string
+        self.maxsize = maxsize
+        self.templates = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, source: str):
+        """Return the compiled template of a source text."""
+        template = self.templates.get(source)
+        if template is not None:
+            self.hits += 1
+            self.templates.move_to_end(source)
+            return template
+
+        self.misses += 1
+        template = self.compiler(source)
+        self.templates[source] = template
+        if len(self.templates) > self.maxsize:
+            self.templates.popitem(last=False)
+        return template
+
+    def stats(self) -> dict:
+        """Return the cache counters."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.templates)}
+
+    def clear(self):
+        """Drop the cached templates and reset the counters."""
+        self.templates.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+class PathExpression(object):
+    """Variable reference like `a.b['c'][0]` evaluated without Jinja.
+
+    The lookups use the `getattr` and `getitem` of the Jinja environment, so
+    the result is the same as the one of the Jinja expression.
+    """
+
+    def __init__(self, name: str, steps: tuple):
+        """Initialization of `PathExpression` class."""
+        self.name = name
+        self.steps = steps
+
+    def evaluate(self, output: dict):
+        """Return the referenced value, the variable must be in the outputs."""
+        value = output[self.name]
+        for getter, key in self.steps:
+            value = getter(value, key)
+        return value
+
+
+def parse_path(expression: str) -> Optional[PathExpression]:
+    """Parse a variable reference, return `None` for any other expression."""
+    match = PATH_NAME.match(expression)
+    if not match or match.group(1) in JINJA_CONSTANTS:
+        return None
+
+    name, steps, position = match.group(1), [], match.end()
+    while expression[position:].strip():
+        match = PATH_STEP.match(expression, position)
+        if not match:
+            return None
+        if match.group("attribute") is not None:
+            steps.append((environment.getattr, match.group("attribute")))
+        elif match.group("index") is not None:
+            steps.append((environment.getitem, int(match.group("index"))))
+        elif match.group("number") is not None:
+            steps.append((environment.getitem, int(match.group("number"))))
+        elif match.group("single") is not None:
+            steps.append((environment.getitem, match.group("single")))
+        else:
+            steps.append((environment.getitem, match.group("double")))
+        position = match.end()
+    return PathExpression(name, tuple(steps))
+
+
+class PathTemplate(object):
+    """Template made of text and variable references, rendered without Jinja.
+
+    It falls back to Jinja when a variable is not in the outputs.
+    """
+
+    def __init__(self, source: str, parts: list):
+        """Initialization of `PathTemplate` class."""
+        self.source = source
+        self.parts = parts
+        self.template = None
+
+    def render(self, **output) -> str:
+        """Render the template like `jinja2.Template.render`."""
+        values = []
+        for part in self.parts:
+            if isinstance(part, str):
+                values.append(part)
+            elif part.name in output:
+                values.append(str(part.evaluate(output)))
+            else:
+                if self.template is None:
+                    self.template = environment.from_string(self.source)
+                return self.template.render(**output)
+        return "".join(values)
+
+
+class CarriageReturnTemplate(object):
+    """Jinja template keeping the carriage returns of its source."""
+
+    def __init__(self, source: str):
+        """Initialization of `CarriageReturnTemplate` class."""
+        self.template = environment.from_string(source.replace("\r", CARRIAGE_RETURN))
+
+    def render(self, **output) -> str:
+        """Render the template like `jinja2.Template.render`."""
+        return self.template.render(**output).replace(CARRIAGE_RETURN, "\r")
+
+
+class PathTemplateExpression(object):
+    """Native expression made of a variable reference, evaluated without Jinja.
+
+    It falls back to Jinja when the variable is not in the outputs.
+    """
+
+    def __init__(self, expression: str, path: PathExpression):
+        """Initialization of `PathTemplateExpression` class."""
+        self.expression = expression
+        self.path = path
+        self.template_expression = None
+
+    def __call__(self, **output):
+        """Evaluate the expression like `jinja2.Environment.compile_expression`."""
+        if self.path.name not in output:
+            if self.template_expression is None:
+                self.template_expression = environment.compile_expression(
+                    self.expression
+                )
+            return self.template_expression(**output)
+
+        value = self.path.evaluate(output)
+        if isinstance(value, jinja2.Undefined):
+            return None
+        return value
+
+
+def compile_template(source: str):
+    """Compile a template, without Jinja for text with variable references.
+
+    Jinja is used for the statements, comments, filters and any other
+    expression, keeping the carriage returns of the source.
+    """
+    if "\r" in source:
+        return CarriageReturnTemplate(source)
+    if "{%" in source or "{#" in source:
+        return environment.from_string(source)
+
+    parts, position = [], 0
+    for match in INTERPOLATION.finditer(source):
+        path = parse_path(match.group(1))
+        if path is None:
+            return environment.from_string(source)
+        start = match.start()
+        parts.extend([source[position:start], path])
+        position = match.end()
+
+    text = source[position:]
+    if "{{" in text:
+        return environment.from_string(source)
+    parts.append(text)
+    return PathTemplate(source, [part for part in parts if part != ""])
+
+
+def compile_expression(expression: str):
+    """Compile a native expression, without Jinja for variable references."""
+    path = parse_path(expression)
+    if path is not None:
+        return PathTemplateExpression(expression, path)
+    return environment.compile_expression(expression)
+
+
+# Templates render JSON documents and URLs, not HTML, and keep their newlines.
+environment = jinja2.Environment(autoescape=False, keep_trailing_newline=True)  # nosec
+template_cache = TemplateCache(environment, compiler=compile_template)
+expression_cache = TemplateCache(environment, compiler=compile_expression)
+
+
+def has_template(value) -> bool:
+    """Whether a value is a string containing template syntax."""
+    return isinstance(value, str) and any(tag in value for tag in TEMPLATE_TAGS[::2])
+
+
+def whole_expression(source: str) -> Optional[str]:
+    """Return the expression of a template made of a single `{{ ... }}` block."""
+    match = WHOLE_EXPRESSION.match(source)
+    if match and not any(tag in match.group(1) for tag in TEMPLATE_TAGS):
+        return match.group(1).strip()
+    return None
+
+
+def render(source: str, output: dict) -> str:
+    """Render a template source with the outputs of the previous tasks."""
+    return template_cache.get(source).render(**output)
+
+
+def resolve(source: str, output: dict):
+    """Render a template, keeping the value of a whole-value reference as is.
+
+    `"{{ created }}"` returns the `created` object itself instead of its text.
+    """
+    expression = whole_expression(source)
+    if expression is None:
+        return render(source, output)
+    return expression_cache.get(expression)(**output)
+
+
+def is_static(node, static_nodes: Optional[set] = None) -> bool:
+    """Whether a JSON-like tree needs no rendering.
+
+    The ids of the static dicts and lists of the tree are added to
+    `static_nodes`, so that `render_tree` can skip these subtrees.
+    """
+    if isinstance(node, str):
+        return not has_template(node)
+    if isinstance(node, dict):
+        # Not short-circuited, every subtree is marked.
+        static = all(
+            [
+                is_static(key, static_nodes) and is_static(value, static_nodes)
+                for key, value in node.items()
+            ]
+        )
+    elif isinstance(node, (list, tuple)):
+        static = all([is_static(item, static_nodes) for item in node])
+    else:
+        return not callable(getattr(node, "serialize", None))
+
+    if static and static_nodes is not None:
+        static_nodes.add(id(node))
+    return static
+
+
+def referenced_names(node) -> set:
+    """Return the names of the variables referenced by the templates of a tree.
+
+    The values with a `serialize(output)` method are inspected through their
+    `value` (see `spintest.types`).
+    """
+    if isinstance(node, str):
+        if not has_template(node):
+            return set()
+        try:
+            return set(meta.find_undeclared_variables(environment.parse(node)))
+        except jinja2.TemplateSyntaxError:
+            return set()
+    if isinstance(node, dict):
+        items = [item for pair in node.items() for item in pair]
+    elif isinstance(node, (list, tuple)):
+        items = node
+    elif callable(getattr(node, "serialize", None)):
+        items = [getattr(node, "value", None)]
+    else:
+        return set()
+    return set().union(*[referenced_names(item) for item in items])
+
+
+def render_tree(node, output: dict, static_nodes=frozenset()):
+    """Render the string leaves of a JSON-like tree containing template syntax.
+
+    Values with a `serialize(output)` method (see `spintest.types`) are
+    replaced by its result. The other leaves and the subtrees whose id is in
+    `static_nodes` are kept as is.
+    """
+    if id(node) in static_nodes:
+        return node
+    if isinstance(node, str):
+        return render(node, output) if has_template(node) else node
+    if isinstance(node, dict):
+        return {
+            render_tree(key, output, static_nodes): render_tree(
+                value, output, static_nodes
+            )
+            for key, value in node.items()
+        }
+    if isinstance(node, (list, tuple)):
+        return [render_tree(item, output, static_nodes) for item in node]
+    if callable(getattr(node, "serialize", None)):
+        return node.serialize(output)
+    return node
@@ -0,0 +1,385 @@
+"""HTTP transports used by tasks to send their requests."""
+
+import asyncio
+import json
+import threading
+import time
+
+import requests
+
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
+
+from requests.structures import CaseInsensitiveDict
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+
+class TransportError(Exception):
+    """The request could not be sent or no response was received."""
+
+
+class TransportTimeout(TransportError):
+    """The connection or the response timed out."""
+
+
+# Connect and read timeouts in seconds, `None` waiting without limit.
+Timeout = Optional[Tuple[Optional[float], Optional[float]]]
+
+
+class Response(object):
+    """Transport agnostic HTTP response."""
+
+    def __init__(self, status_code: int, content: bytes, headers=None, encoding=None):
+        """Initialization of `Response` class."""
+        self.status_code = status_code
+        self.content = content
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.encoding = encoding or "utf-8"
+        self._body = None
+        self._decoded = False
+
+    @property
+    def text(self) -> str:
+        """Decoded body of the response."""
+        return self.content.decode(self.encoding, errors="replace")
+
+    def json(self):
+        """Body of the response decoded from JSON."""
+        return json.loads(self.text)
+
+    @property
+    def body(self):
+        """Body decoded from JSON, or its text, decoded once."""
+        if not self._decoded:
+            try:
+                self._body = self.json()
+            except ValueError:
+                self._body = self.text
+            self._decoded = True
+        return self._body
+
+
+def as_response(response) -> Response:
+    """Return a transport response, converting a `requests.Response` like one.
+
+    The custom transports may return any response with a `status_code`, a
+    `content`, `headers` and an `encoding`.
+    """
+    if isinstance(response, Response):
+        return response
+    return Response(
+        response.status_code,
+        response.content,
+        headers=response.headers,
+        encoding=response.encoding,
+    )
+
+
+def base_url(url: str) -> str:
+    """Return the scheme and network location of an URL."""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class PooledTransport(object):
+    """Base of the transports keeping one pooled session per base URL."""
+
+    name = None
+
+    def __init__(
+        self,
+        pool_size: int = 10,
+        idle_timeout: Optional[float] = 15.0,
+        keep_alive: bool = True,
+    ):
+        """Initialization of `PooledTransport` class."""
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.keep_alive = keep_alive
+        self.sessions = {}
+        # Time the last request of each base URL was done, and the number of
+        # requests in flight.
+        self.last_used = {}
+        self.in_flight = {}
+        self.connections = {}
+
+    def _stats(self, base: str) -> dict:
+        if base not in self.connections:
+            self.connections[base] = {"requests": 0, "created": 0, "reused": 0}
+        return self.connections[base]
+
+    async def _session(self, url: str):
+        """Borrow the session of the base URL, opening it if needed.
+
+        A session idle for `idle_timeout` is closed first, unless requests
+        are still in flight on it. `_done` must be called once the request
+        is done.
+        """
+        base = base_url(url)
+        now = time.monotonic()
+        if (
+            base in self.sessions
+            and self.idle_timeout is not None
+            and not self.in_flight.get(base)
+            and now - self.last_used[base] > self.idle_timeout
+        ):
+            await self._release(base)
+        if base not in self.sessions:
+            self.sessions[base] = self._open(base)
+            self.last_used[base] = now
+        self.in_flight[base] = self.in_flight.get(base, 0) + 1
+        self._stats(base)["requests"] += 1
+        return self.sessions[base]
+
+    def _done(self, url: str):
+        """Mark a request borrowing the session of the base URL done."""
+        base = base_url(url)
+        self.in_flight[base] -= 1
+        if base in self.sessions:
+            self.last_used[base] = time.monotonic()
+
+    async def _release(self, base: str):
+        """Close the session of the base URL."""
+        session = self.sessions.pop(base)
+        self.last_used.pop(base)
+        await self._close(base, session)
+
+    def _open(self, base: str):
+        raise NotImplementedError
+
+    async def _close(self, base: str, session):
+        raise NotImplementedError
+
+    def connection_stats(self) -> dict:
+        """Return the connection counters per base URL."""
+        return {base: dict(stats) for base, stats in self.connections.items()}
+
+    async def warm_up(
+        self, url: str, verify: bool = True, timeout: Optional[float] = None
+    ):
+        """Open a pooled connection to the base URL of `url`.
+
+        A `HEAD` request is sent, any response meaning the URL is reachable.
+        Raise `TransportError` if it is not.
+        """
+        await self.request("HEAD", url, verify=verify, timeout=(timeout, timeout))
+
+    async def close(self):
+        """Release the resources held by the transport."""
+        for base in list(self.sessions):
+            await self._release(base)
+
+
+class RequestsTransport(PooledTransport):
+    """Transport running blocking `requests` calls in the loop executor."""
+
+    name = "requests"
+
+    def _open(self, base):
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.pool_size
+        )
+        session.mount(base, adapter)
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    @staticmethod
+    def _created(session) -> int:
+        """Number of connections opened by the pools of a session."""
+        created = 0
+        for adapter in session.adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                created += pools[key].num_connections
+        return created
+
+    async def _close(self, base, session):
+        self._stats(base)["created"] += self._created(session)
+        session.close()
+
+    def connection_stats(self):
+        stats = super().connection_stats()
+        for base, session in self.sessions.items():
+            stats[base]["created"] += self._created(session)
+        for counters in stats.values():
+            counters["reused"] = max(counters["requests"] - counters["created"], 0)
+        return stats
+
+    def _send(self, session, method, url, body, headers, verify, timeout):
+        response = session.request(
+            method, url, json=body, headers=headers, verify=verify, timeout=timeout
+        )
+        return Response(
+            response.status_code,
+            response.content,
+            headers=response.headers,
+            encoding=response.encoding or response.apparent_encoding,
+        )
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        body=None,
+        headers=None,
+        verify: bool = True,
+        timeout: Timeout = None,
+    ) -> Response:
+        """Send a request and return its response.
+
+        The executor thread is only freed once the request is done, so a
+        cancelled request still runs until its `timeout`.
+        """
+        session = await self._session(url)
+        loop = asyncio.get_event_loop()
+        # The request is done once its thread is, even if it was cancelled,
+        # or at once if it was cancelled before its thread started.
+        lock = threading.Lock()
+        state = {"started": False, "abandoned": False}
+
+        def send():
+            with lock:
+                if state["abandoned"]:
+                    return None
+                state["started"] = True
+            try:
+                return self._send(session, method, url, body, headers, verify, timeout)
+            finally:
+                try:
+                    loop.call_soon_threadsafe(self._done, url)
+                except RuntimeError:  # The loop is closed, the run is over.
+                    pass
+
+        def abandon(future: asyncio.Future):
+            if not future.cancelled():
+                return
+            with lock:
+                if state["started"]:
+                    return
+                state["abandoned"] = True
+            self._done(url)
+
+        future = loop.run_in_executor(None, send)
+        future.add_done_callback(abandon)
+        try:
+            return await future
+        except requests.exceptions.Timeout as e:
+            raise TransportTimeout(str(e)) from e
+        except requests.exceptions.RequestException as e:
+            raise TransportError(str(e)) from e
+
+
+class AiohttpTransport(PooledTransport):
+    """Transport sending requests natively on the event loop with `aiohttp`."""
+
+    name = "aiohttp"
+
+    def __init__(self, **kwargs):
+        """Initialization of `AiohttpTransport` class."""
+        if aiohttp is None:
+            raise ImportError("The 'aiohttp' transport requires aiohttp installed.")
+        super().__init__(**kwargs)
+
+    def _open(self, base):
+        stats = self._stats(base)
+
+        async def on_connection_create_end(session, context, params):
+            stats["created"] += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            stats["reused"] += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+
+        if self.keep_alive:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size, keepalive_timeout=self.idle_timeout
+            )
+        else:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, force_close=True)
+        return aiohttp.ClientSession(connector=connector, trace_configs=[trace_config])
+
+    async def _close(self, base, session):
+        await session.close()
+
+    async def _session(self, url):
+        # Idle connections are already expired by the connector keep-alive.
+        base = base_url(url)
+        if base in self.sessions and self.sessions[base].closed:
+            self.sessions.pop(base)
+        if base not in self.sessions:
+            self.sessions[base] = self._open(base)
+            self.last_used[base] = time.monotonic()
+        self.in_flight[base] = self.in_flight.get(base, 0) + 1
+        self._stats(base)["requests"] += 1
+        return self.sessions[base]
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        body=None,
+        headers=None,
+        verify: bool = True,
+        timeout: Timeout = None,
+    ) -> Response:
+        """Send a request and return its response."""
+        session = await self._session(url)
+        options = {}
+        if timeout is not None:
+            options["timeout"] = aiohttp.ClientTimeout(
+                sock_connect=timeout[0], sock_read=timeout[1]
+            )
+        try:
+            async with session.request(
+                method,
+                url,
+                json=body,
+                headers=headers,
+                ssl=None if verify else False,
+                **options,
+            ) as response:
+                content = await response.read()
+                return Response(
+                    response.status,
+                    content,
+                    headers=response.headers,
+                    encoding=response.get_encoding() if content else None,
+                )
+        except asyncio.TimeoutError as e:
+            raise TransportTimeout(str(e) or "Request timed out.") from e
+        except aiohttp.ClientError as e:
+            raise TransportError(str(e)) from e
+        finally:
+            self._done(url)
+
+
+TRANSPORTS = {
+    RequestsTransport.name: RequestsTransport,
+    AiohttpTransport.name: AiohttpTransport,
+}
+
+
+def get_transport(transport=None, **options):
+    """Return a transport instance from a transport name or instance.
+
+    The options (`pool_size`, `idle_timeout`, `keep_alive`) configure the
+    connection pool of a transport created from its name.
+    """
+    if transport is None:
+        transport = RequestsTransport.name
+    if isinstance(transport, str):
+        if transport not in TRANSPORTS:
+            raise ValueError(
+                f"Unknown transport '{transport}', expected one of {list(TRANSPORTS)}."
+            )
+        return TRANSPORTS[transport](**options)
+    return transport
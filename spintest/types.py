@@ -1,8 +1,9 @@
 """Allow computed value to have types."""
 
-import jinja2
 import json
 
+from spintest.template import render, resolve
+
 
 class JSONValue(object):
     """A base class that implements type-aware serialization values."""
@@ -11,8 +12,7 @@ class JSONValue(object):
         self.value = value
 
     def get_value(self, output):
-        template = jinja2.Template(self.value)
-        return template.render(**output)
+        return render(self.value, output)
 
     def serialize(self, output):
         return self.get_value(output)
@@ -46,6 +46,13 @@ class Bool(JSONValue):
         return bool(self.get_value(output))
 
 
+class Native(JSONValue):
+    """Keeps the referenced value as is (`dict`, `list`, number...)."""
+
+    def get_value(self, output):
+        return resolve(self.value, output)
+
+
 class TypeAwareEncoder(json.JSONEncoder):
 
     output = None
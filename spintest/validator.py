@@ -2,12 +2,12 @@
 
 import typing
 import inspect
-from schema import Schema, SchemaError, Or, Optional
+from schema import And, Schema, SchemaError, Or, Optional
 
 
 TASK_SCHEMA = Schema(
     {
-        Optional("type", default="http_request"): Or("http_request", "e2e"),
+        Optional("type", default="http_request"): Or("http_request", "e2e", "poll"),
         "method": str,
         Optional("route", default="/"): str,
         Optional("name"): str,
@@ -22,6 +22,17 @@ TASK_SCHEMA = Schema(
             Optional("body"): Or(dict, str),
             Optional("expected_match", default="strict"): Or("partial", "strict"),
         },
+        Optional("until"): {
+            Optional("code"): int,
+            Optional("body"): Or(dict, str),
+            Optional("expected_match"): Or("partial", "strict"),
+        },
+        Optional("poll"): {
+            Optional("interval"): Or(int, float),
+            Optional("backoff"): Or(int, float),
+            Optional("max_interval"): Or(int, float),
+            Optional("timeout"): Or(int, float),
+        },
         Optional("target"): callable,
         Optional("target_input", default={}): dict,
         Optional("fail_on"): [
@@ -31,10 +42,23 @@ TASK_SCHEMA = Schema(
                 Optional("expected_match", default="strict"): Or("partial", "strict"),
             }
         ],
+        Optional("timeout"): Or(
+            int,
+            float,
+            {Optional("connect"): Or(int, float), Optional("read"): Or(int, float)},
+        ),
         Optional("retry", default=0): int,
-        Optional("delay", default=1): int,
+        Optional("delay", default=1): Or(int, float),
+        Optional("backoff"): Or(int, float),
+        Optional("max_delay"): Or(int, float),
+        Optional("jitter"): And(Or(int, float), lambda jitter: 0 <= jitter <= 1),
+        Optional("retry_timeout"): Or(int, float),
+        Optional("retry_on"): [Or(int, "body", "error", "timeout")],
+        Optional("retry_after"): bool,
         Optional("ignore", default=False): bool,
+        Optional("decode_body"): bool,
         Optional("rollback"): [Or(str, dict)],
+        Optional("depends_on"): [str],
     }
 )
 
@@ -1,5 +1,10 @@
+import json
 import pytest
 import os
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -8,3 +13,35 @@ def set_proxy():
     os.environ["http_proxy"] = ""
     os.environ["https_proxy"] = ""
     os.environ["ftp_proxy"] = ""
+
+
+class JSONHandler(BaseHTTPRequestHandler):
+    """Return the path of the request, with a 500 status under `/fail`.
+
+    The responses under `/slow` are sent after half a second.
+    """
+
+    def do_GET(self):
+        if self.path.startswith("/slow"):
+            time.sleep(0.5)
+        status = 500 if self.path.startswith("/fail") else 200
+        body = json.dumps({"path": self.path}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    """URL of a local HTTP server, reachable from other processes."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), JSONHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
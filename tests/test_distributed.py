@@ -0,0 +1,147 @@
+"""Test of the execution distributed to workers."""
+
+import asyncio
+import datetime
+import json
+import os
+import tempfile
+
+import pytest
+
+from spintest import logger
+from spintest.distributed import (
+    DistributedTaskManager,
+    receive,
+    send,
+    worker,
+)
+
+logger.disabled = True
+
+
+async def target(url, **kwargs):
+    return {"url": url}
+
+
+E2E_TASKS = [
+    {"type": "e2e", "target": target, "output": "e2e"},
+    {"method": "GET", "route": "test"},
+]
+
+
+async def dated_target(url, **kwargs):
+    return {"date": datetime.date(2025, 1, 1)}
+
+
+NOT_JSON_TASKS = [{"type": "e2e", "target": dated_target, "output": "e2e"}]
+
+
+def test_distributed_run_with_local_workers(server_url):
+    urls = [f"{server_url}/{index}/" for index in range(5)]
+    streamed = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        report_path = os.path.join(directory, "report.json")
+        manager = DistributedTaskManager(
+            urls,
+            [
+                {"method": "GET", "route": "test", "output": "test"},
+                {"method": "GET", "route": "{{ test['path'] }}/next"},
+            ],
+            token="ABC",
+            workers=2,
+            unit_size=2,
+            generate_report=report_path,
+        )
+        result = asyncio.new_event_loop().run_until_complete(
+            manager.run(on_result=streamed.append)
+        )
+        with open(report_path) as file:
+            reports = json.load(file)
+
+    assert True is result
+    assert 10 == len(streamed)
+    assert {"***"} == {
+        result["output"]["__token__"] for results in streamed for result in results
+    }
+    assert urls == [report["url"] for report in reports]
+    assert reports == manager.all_reports
+    for index, report in enumerate(reports):
+        assert [f"/{index}/test", f"/{index}/test/next"] == [
+            task["body"]["path"] for task in report["reports"]
+        ]
+        assert "***" == report["reports"][0]["output"]["__token__"]
+    assert 10 == manager.stats["renders"] + manager.stats["renders_skipped"]
+
+
+def test_distributed_run_failure(server_url):
+    manager = DistributedTaskManager(
+        [f"{server_url}/", f"{server_url}/fail/"],
+        [{"method": "GET", "route": "test"}],
+        workers=1,
+    )
+
+    assert False is asyncio.new_event_loop().run_until_complete(manager.run())
+    assert 2 == len(manager.all_reports)
+
+
+def test_distributed_unit_served_again_after_disconnection(server_url):
+    manager = DistributedTaskManager(
+        [f"{server_url}/"], "tests.test_distributed:E2E_TASKS", key="secret"
+    )
+
+    async def main():
+        run = asyncio.ensure_future(manager.run())
+        while not manager.port:
+            await asyncio.sleep(0.01)
+
+        reader, writer = await asyncio.open_connection(manager.host, manager.port)
+        await send(writer, {"type": "hello", "key": "wrong"})
+        with pytest.raises(ConnectionError):
+            await receive(reader)
+        writer.close()
+
+        reader, writer = await asyncio.open_connection(manager.host, manager.port)
+        await send(writer, {"type": "hello", "key": "secret"})
+        unit = await receive(reader)
+        writer.close()
+
+        await worker(manager.host, manager.port, "secret")
+        return unit, await run
+
+    unit, result = asyncio.new_event_loop().run_until_complete(main())
+
+    assert "unit" == unit["type"]
+    assert "tests.test_distributed:E2E_TASKS" == unit["tasks"]
+    assert True is result
+    assert ["SUCCESS", "SUCCESS"] == [
+        report["status"] for report in manager.all_reports[0]["reports"]
+    ]
+
+
+def test_distributed_unit_fails_if_results_are_not_json(server_url):
+    manager = DistributedTaskManager(
+        [f"{server_url}/"], "tests.test_distributed:NOT_JSON_TASKS", key="secret"
+    )
+    streamed = []
+
+    async def main():
+        run = asyncio.ensure_future(manager.run(on_result=streamed.append))
+        while not manager.port:
+            await asyncio.sleep(0.01)
+        await worker(manager.host, manager.port, "secret")
+        return await run
+
+    result = asyncio.new_event_loop().run_until_complete(main())
+
+    assert False is result
+    assert [] == streamed
+    assert [] == manager.all_reports
+    assert "not JSON" in manager.unit_results[0]["error"]
+
+
+def test_distributed_tasks_must_be_json():
+    with pytest.raises(ValueError):
+        DistributedTaskManager(["http://test.com"], E2E_TASKS)
+    with pytest.raises(ValueError):
+        DistributedTaskManager(["http://test.com"], [], token=lambda: "ABC")
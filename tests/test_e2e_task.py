@@ -1,4 +1,6 @@
+import asyncio
 import pytest
+import time
 from spintest.e2e_task import E2ETask
 from unittest.mock import AsyncMock
 from spintest import spintest
@@ -105,6 +107,18 @@ async def test_e2e_task_run_failure_exception(valid_task, url):
     )
 
 
+@pytest.mark.asyncio
+async def test_e2e_task_run_deadline(valid_task, url):
+    async def slow_target(url):
+        await asyncio.sleep(1)
+
+    valid_task["target"] = slow_target
+    task = E2ETask(url, valid_task, deadline=time.monotonic() + 0.05)
+    response = await task.run()
+    assert response["status"] == "TIMEOUT"
+    assert response["duration_sec"] < 0.5
+
+
 @pytest.mark.asyncio
 async def test_e2e_task_initialization_invalid_task(invalid_task, url):
     task = E2ETask(url, invalid_task)
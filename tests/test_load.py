@@ -0,0 +1,276 @@
+"""Test of the load testing."""
+
+import asyncio
+import json
+import os
+import tempfile
+
+import pytest
+
+from spintest import logger
+from spintest.load import (
+    CapacitySearch,
+    LatencyStats,
+    LoadRunner,
+    arrival_offset,
+    breaches,
+    percentile,
+)
+
+logger.disabled = True
+
+
+def run(runner):
+    return asyncio.new_event_loop().run_until_complete(runner.run())
+
+
+def test_percentile():
+    latencies = [float(value) for value in range(1, 101)]
+
+    assert 50.0 == percentile(latencies, 50)
+    assert 99.0 == percentile(latencies, 99)
+    assert 100.0 == percentile(latencies, 100)
+    assert 1.0 == percentile([1.0], 90)
+    assert None is percentile([], 50)
+
+
+def test_latency_stats_summary():
+    stats = LatencyStats("get", "GET", "/test")
+    for latency in (0.1, 0.2, 0.3, 0.4):
+        stats.add(latency, latency > 0.3)
+
+    summary = stats.summary(elapsed=2.0)
+
+    assert 4 == summary["requests"]
+    assert 0.25 == summary["error_rate"]
+    assert 2.0 == summary["rps"]
+    assert {"mean": 0.25, "p50": 0.2, "p90": 0.4, "p99": 0.4, "max": 0.4} == summary[
+        "latency_sec"
+    ]
+
+
+def test_load_runner_iterations(server_url):
+    with tempfile.TemporaryDirectory() as directory:
+        report_path = os.path.join(directory, "report.json")
+        runner = LoadRunner(
+            [f"{server_url}/a/", f"{server_url}/b/"],
+            [
+                {"name": "first", "method": "GET", "route": "test", "output": "test"},
+                {
+                    "name": "second",
+                    "method": "GET",
+                    "route": "{{ test['path'] }}/next",
+                    "expected": {"body": {"path": None}},
+                },
+                {
+                    "name": "fail",
+                    "method": "GET",
+                    "route": "/fail",
+                    "ignore": True,
+                    "delay": 0,
+                },
+            ],
+            users=3,
+            iterations=4,
+            generate_report=report_path,
+        )
+        report = run(runner)
+        with open(report_path) as file:
+            assert report == json.load(file)
+
+    assert 3 == report["users"]
+    assert 12 == report["iterations"]
+    assert 36 == report["requests"]
+    assert 12 == report["errors"]
+    assert 0.3333 == report["error_rate"]
+    assert ["first", "second", "fail"] == [task["name"] for task in report["tasks"]]
+    second = report["tasks"][1]
+    assert "{{ test['path'] }}/next" == second["route"]
+    assert 0 == second["errors"]
+    assert second["latency_sec"]["p50"] <= second["latency_sec"]["max"]
+
+
+def test_load_runner_duration(server_url):
+    report = run(
+        LoadRunner(
+            [f"{server_url}/"],
+            [{"method": "GET", "route": "test"}],
+            users=2,
+            duration=0.3,
+        )
+    )
+
+    assert 0.3 <= report["duration_sec"] < 0.6
+    assert report["iterations"] == report["requests"]
+    assert 0 < report["rps"]
+
+
+def test_arrival_offset():
+    assert [0.0, 0.5, 1.0] == [
+        arrival_offset(index, 2, None, None) for index in range(3)
+    ]
+    # From 1 to 3 per second over 1 second, 2 iterations start in 1 second.
+    assert 0.0 == arrival_offset(0, 1, 3, 1)
+    assert 1.0 == arrival_offset(2, 1, 3, 1)
+    assert None is arrival_offset(10, 2, 0, 1)
+
+
+def test_load_runner_open_model(server_url):
+    runner = LoadRunner(
+        [f"{server_url}/"],
+        [
+            {"name": "get", "method": "GET", "route": "test", "output": "test"},
+            {
+                "name": "fail",
+                "method": "GET",
+                "route": "/fail",
+                "ignore": True,
+                "delay": 0,
+            },
+        ],
+        duration=0.5,
+        arrival_rate=20,
+    )
+    report = run(runner)
+
+    assert "open" == report["model"]
+    assert "users" not in report
+    assert 10 == report["iterations"]
+    assert 0 == report["dropped"]
+    assert 20 == report["requests"]
+    assert 10 == report["errors"]
+    assert report["scheduling_lag_sec"]["max"] < 0.5
+    get = report["tasks"][0]
+    assert get["latency_sec"]["p50"] <= get["corrected_latency_sec"]["p50"]
+    assert 10 == len(runner.lags)
+
+
+def test_load_runner_open_model_drops_iterations(server_url):
+    report = run(
+        LoadRunner(
+            [f"{server_url}/"],
+            [{"method": "GET", "route": "/fail", "retry": 1, "delay": 1}],
+            iterations=4,
+            arrival_rate=50,
+            max_active=1,
+        )
+    )
+
+    assert 1 == report["iterations"]
+    assert 3 == report["dropped"]
+    # Both attempts are measured on their own, without the retry delay.
+    assert 2 == report["requests"]
+    assert 2 == report["errors"]
+    assert report["tasks"][0]["latency_sec"]["max"] < 0.5
+    assert report["tasks"][0]["corrected_latency_sec"]["max"] < 0.5
+
+
+def test_load_runner_options():
+    with pytest.raises(ValueError):
+        LoadRunner(["http://test.com"], [])
+    with pytest.raises(ValueError):
+        LoadRunner(["http://test.com"], [], users=0, iterations=1)
+    with pytest.raises(ValueError):
+        LoadRunner(["http://test.com"], [], iterations=1, arrival_rate=0)
+    with pytest.raises(ValueError):
+        LoadRunner(["http://test.com"], [], arrival_rate=1, final_arrival_rate=2)
+    with pytest.raises(ValueError):
+        run(LoadRunner(["http://test.com"], [{"method": "FOO"}], iterations=1))
+
+
+def test_breaches():
+    report = {
+        "requests": 10,
+        "error_rate": 0.02,
+        "dropped": 0,
+        "tasks": [
+            {"latency_sec": {"p99": 0.1}, "corrected_latency_sec": {"p99": 0.4}},
+            {"latency_sec": {"p99": 0.2}},
+        ],
+    }
+
+    assert [] == breaches(report, {"error_rate": 0.05, "p99": 0.5})
+    assert ["error_rate", "p99"] == breaches(report, {"error_rate": 0.01, "p99": 0.3})
+    assert ["dropped"] == breaches({**report, "dropped": 1}, {"p99": 1})
+    assert ["requests"] == breaches({**report, "requests": 0}, {"p99": 1})
+
+
+def test_capacity_search_steps(server_url):
+    with tempfile.TemporaryDirectory() as directory:
+        report_path = os.path.join(directory, "capacity.json")
+        search = CapacitySearch(
+            [f"{server_url}/"],
+            [{"method": "GET", "route": "test"}],
+            slo={"error_rate": 0, "p99": 5},
+            start_rate=10,
+            step=10,
+            max_rate=30,
+            step_duration=0.2,
+            generate_report=report_path,
+        )
+        report = run(search)
+        with open(report_path) as file:
+            assert report == json.load(file)
+
+    assert 30 == report["max_sustained_rate"]
+    assert [10, 20, 30] == [step["arrival_rate"] for step in report["steps"]]
+    assert all(step["sustained"] for step in report["steps"])
+    assert [2, 4, 6] == [step["iterations"] for step in report["steps"]]
+
+
+def test_capacity_search_stops_on_breach(server_url):
+    report = run(
+        CapacitySearch(
+            [f"{server_url}/"],
+            [{"method": "GET", "route": "/fail", "ignore": True, "delay": 0}],
+            slo={"error_rate": 0.5},
+            start_rate=10,
+            step=10,
+            step_duration=0.2,
+        )
+    )
+
+    assert None is report["max_sustained_rate"]
+    assert [["error_rate"]] == [step["breaches"] for step in report["steps"]]
+
+
+class FakeCapacitySearch(CapacitySearch):
+    async def _load_test(self, rate):
+        return {
+            "requests": 1,
+            "error_rate": 1.0 if rate > 37 else 0.0,
+            "dropped": 0,
+            "tasks": [],
+        }
+
+
+def test_capacity_search_binary():
+    search = FakeCapacitySearch(
+        ["http://test.com"],
+        [],
+        slo={"error_rate": 0.1},
+        start_rate=10,
+        max_rate=100,
+        search="binary",
+        step_duration=1,
+    )
+    report = run(search)
+
+    assert 36 < report["max_sustained_rate"] <= 37
+    rates = [step["sustained"] for step in report["steps"]]
+    assert [True, False] == rates[:2]
+    assert 9 == len(rates)
+
+
+def test_capacity_search_options():
+    options = {"slo": {"p99": 1}, "start_rate": 1, "step_duration": 1}
+    with pytest.raises(ValueError):
+        CapacitySearch([], [], **{**options, "slo": {"p42": 1}}, step=1)
+    with pytest.raises(ValueError):
+        CapacitySearch([], [], **options)
+    with pytest.raises(ValueError):
+        CapacitySearch([], [], **options, search="binary", max_rate=1)
+    with pytest.raises(ValueError):
+        CapacitySearch([], [], **options, search="linear")
+    with pytest.raises(ValueError):
+        CapacitySearch([], [], **{**options, "step_duration": 0}, step=1)
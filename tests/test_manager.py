@@ -1,10 +1,11 @@
+import asyncio
 import os
 import json
 import httpretty
 import pytest
 import shutil
 import time
-from spintest import logger, spintest
+from spintest import logger, spintest, TaskManager
 from urllib.parse import urlparse
 
 logger.disabled = True
@@ -94,6 +95,27 @@ def test_manager_basic_generate_report_with_token():
     assert True is validate_report(report_path)
 
 
+@httpretty.activate
+def test_manager_on_result_hides_token():
+    httpretty.register_uri(
+        httpretty.GET, "http://test.com/test", body=json.dumps({"foo": "bar"})
+    )
+    streamed = []
+
+    manager = TaskManager(
+        ["http://test.com"], [{"method": "GET", "route": "/test"}] * 2, token="ABC"
+    )
+    result = asyncio.new_event_loop().run_until_complete(
+        manager.run(on_result=streamed.append)
+    )
+
+    assert True is result
+    assert ["***", "***"] == [
+        report["output"]["__token__"] for results in streamed for report in results
+    ]
+    assert "Bearer ABC" == httpretty.last_request().headers["Authorization"]
+
+
 def httpretty_body_that_waits_and_returns(duration, return_value):
     def inner(_req, _uri, _headers):
         time.sleep(duration)
@@ -212,3 +234,397 @@ def test_manager_reports_total_duration():
     total_duration = spintest_reports[0]["total_duration_sec"]
     assert total_duration == total_duration_calcuate
     assert total_duration >= 0.5
+
+
+@httpretty.activate
+def test_manager_reports_connection_reuse():
+    """Test spintest reuses pooled connections across tasks"""
+    httpretty.register_uri(
+        httpretty.GET, "http://test.com/test", body=json.dumps({"foo": "bar"})
+    )
+
+    report_path = os.path.join(REPORT_DIR, "connection_report.json")
+    spintest(
+        ["http://test.com/a", "http://test.com/b"],
+        [{"method": "GET", "route": "/test"}] * 2,
+        generate_report=report_path,
+    )
+    spintest_reports = read_report(report_path)
+
+    for suite_report in spintest_reports:
+        assert {"requests": 4, "created": 1, "reused": 3} == suite_report["connections"]
+
+
+@httpretty.activate
+def test_manager_idle_timeout_closes_connections():
+    """Test spintest opens new connections after the idle timeout"""
+    httpretty.register_uri(
+        httpretty.GET, "http://test.com/test", body=json.dumps({"foo": "bar"})
+    )
+
+    report_path = os.path.join(REPORT_DIR, "idle_connection_report.json")
+    spintest(
+        ["http://test.com"],
+        [{"method": "GET", "route": "/test"}] * 2,
+        generate_report=report_path,
+        idle_timeout=0,
+    )
+    spintest_reports = read_report(report_path)
+
+    assert {"requests": 2, "created": 2, "reused": 0} == spintest_reports[0][
+        "connections"
+    ]
+
+
+def run_manager(manager):
+    results = []
+    loop = asyncio.new_event_loop()
+    while True:
+        try:
+            results.append(loop.run_until_complete(manager.next()))
+        except StopAsyncIteration:
+            break
+    loop.close()
+    return results
+
+
+@httpretty.activate
+def test_manager_pipeline_does_not_wait_for_slow_urls():
+    """Test each URL runs its scenario on its own in parallel"""
+    httpretty.register_uri(
+        httpretty.GET,
+        "http://slow.com/first",
+        body=httpretty_body_that_waits_and_returns(0.3, [200, {}, "{}"]),
+    )
+    for route in ("http://slow.com/second", "http://fast.com/first"):
+        httpretty.register_uri(httpretty.GET, route)
+    httpretty.register_uri(httpretty.GET, "http://fast.com/second", status=500)
+    httpretty.register_uri(httpretty.DELETE, "http://fast.com/first")
+
+    manager = TaskManager(
+        ["http://slow.com", "http://fast.com"],
+        [
+            {
+                "method": "GET",
+                "route": "/first",
+                "rollback": [{"method": "DELETE", "route": "/first"}],
+            },
+            {"method": "GET", "route": "/second", "delay": 0},
+        ],
+        parallel=True,
+    )
+    results = run_manager(manager)
+
+    assert [
+        ("http://fast.com", "GET", "SUCCESS"),
+        ("http://fast.com", "GET", "FAILED"),
+        ("http://fast.com", "DELETE", "SUCCESS"),
+        ("http://slow.com", "GET", "SUCCESS"),
+        ("http://slow.com", "GET", "SUCCESS"),
+    ] == [
+        (result["url"], result["task"]["method"], result["status"])
+        for result in results
+    ]
+
+
+@httpretty.activate
+def test_manager_lockstep_waits_for_every_url():
+    """Test the lockstep parallel mode runs each task on every URL at once"""
+    httpretty.register_uri(
+        httpretty.GET,
+        "http://slow.com/test",
+        body=httpretty_body_that_waits_and_returns(0.1, [200, {}, "{}"]),
+    )
+    httpretty.register_uri(httpretty.GET, "http://fast.com/test")
+
+    manager = TaskManager(
+        ["http://slow.com", "http://fast.com"],
+        [{"method": "GET", "route": "/test"}] * 2,
+        parallel=True,
+        parallel_mode="lockstep",
+    )
+    results = run_manager(manager)
+
+    assert 2 == len(results)
+    for step in results:
+        assert ["SUCCESS", "SUCCESS"] == [result["status"] for result in step]
+
+
+def test_manager_unknown_parallel_mode():
+    with pytest.raises(ValueError):
+        TaskManager(["http://test.com"], [], parallel=True, parallel_mode="foo")
+    with pytest.raises(ValueError):
+        TaskManager(["http://test.com"], [], concurrency=0)
+
+
+@httpretty.activate
+def test_manager_concurrency_runs_urls_at_once():
+    """Test the URLs run concurrently, each one with its own outputs"""
+    urls = [f"http://test{index}.com" for index in range(3)]
+    running = {"now": 0, "max": 0}
+
+    async def target(url, **kwargs):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0.1)
+        running["now"] -= 1
+        return {"id": url[7:12]}
+
+    for url in urls:
+        httpretty.register_uri(httpretty.GET, f"{url}/{url[7:12]}")
+
+    manager = TaskManager(
+        urls,
+        [
+            {"name": "e2e", "type": "e2e", "target": target, "output": "e2e"},
+            {"name": "get", "method": "GET", "route": "/{{ e2e['id'] }}"},
+        ],
+        concurrency=2,
+    )
+    results = run_manager(manager)
+
+    assert 2 == running["max"]
+    assert 6 == len(results)
+    assert all(result["status"] == "SUCCESS" for result in results)
+    for url in urls:
+        assert ["e2e", "get"] == [
+            result["name"] for result in results if result["url"] == url
+        ]
+
+
+@httpretty.activate
+def test_manager_dag_scheduling():
+    """Test independent tasks run at once, dependent ones wait for outputs"""
+    for route in ("first", "second"):
+        httpretty.register_uri(
+            httpretty.GET,
+            f"http://test.com/{route}",
+            body=httpretty_body_that_waits_and_returns(
+                0.2, [200, {}, json.dumps({"id": route})]
+            ),
+        )
+    httpretty.register_uri(httpretty.GET, "http://test.com/first/second")
+
+    report_path = os.path.join(REPORT_DIR, "dag_report.json")
+    start = time.monotonic()
+    result = spintest(
+        ["http://test.com"],
+        [
+            {"name": "first", "method": "GET", "route": "/first", "output": "a"},
+            {"name": "second", "method": "GET", "route": "/second", "output": "b"},
+            {"name": "both", "method": "GET", "route": "/{{ a.id }}/{{ b.id }}"},
+        ],
+        generate_report=report_path,
+        scheduling="dag",
+    )
+
+    assert True is result
+    assert time.monotonic() - start < 0.4
+    suite_report = read_report(report_path)[0]
+    assert "both" == suite_report["reports"][-1]["name"]
+    critical_path = suite_report["critical_path"]
+    assert "both" == critical_path["tasks"][-1]["name"]
+    assert 2 == len(critical_path["tasks"])
+    assert 0.2 <= critical_path["duration_sec"]
+
+
+@httpretty.activate
+def test_manager_dag_scheduling_several_urls():
+    """Test the sequential dag scheduling runs the URLs one after the other"""
+    for path in ("a", "b"):
+        httpretty.register_uri(
+            httpretty.GET,
+            f"http://test.com/{path}/first",
+            body=json.dumps({"id": path}),
+        )
+        httpretty.register_uri(httpretty.GET, f"http://test.com/{path}/{path}")
+
+    manager = TaskManager(
+        ["http://test.com/a/", "http://test.com/b/"],
+        [
+            {"method": "GET", "route": "first", "output": "first"},
+            {"name": "second", "method": "GET", "route": "{{ first['id'] }}"},
+        ],
+        scheduling="dag",
+    )
+    results = run_manager(manager)
+
+    assert 4 == len(results)
+    assert all(result["status"] == "SUCCESS" for result in results)
+    assert ["/a/first", "/a/a", "/b/first", "/b/b"] == [
+        request.path for request in httpretty.latest_requests()
+    ]
+
+
+@httpretty.activate
+def test_manager_dag_scheduling_rollback():
+    """Test the rollback of the started tasks runs in the scenario order"""
+    httpretty.register_uri(httpretty.POST, "http://test.com/first")
+    httpretty.register_uri(
+        httpretty.POST,
+        "http://test.com/second",
+        body=httpretty_body_that_waits_and_returns(0.1, [200, {}, "{}"]),
+    )
+    httpretty.register_uri(httpretty.GET, "http://test.com/fail", status=500)
+    httpretty.register_uri(httpretty.DELETE, "http://test.com/first")
+    httpretty.register_uri(httpretty.DELETE, "http://test.com/second")
+
+    manager = TaskManager(
+        ["http://test.com"],
+        [
+            {
+                "method": "POST",
+                "route": "/first",
+                "rollback": [
+                    {"name": "delete_first", "method": "DELETE", "route": "/first"}
+                ],
+            },
+            {
+                "method": "POST",
+                "route": "/second",
+                "rollback": [
+                    {"name": "delete_second", "method": "DELETE", "route": "/second"}
+                ],
+            },
+            {"name": "fail", "method": "GET", "route": "/fail", "delay": 0},
+            {"name": "never", "method": "GET", "route": "/", "depends_on": ["fail"]},
+        ],
+        scheduling="dag",
+    )
+    results = run_manager(manager)
+
+    assert ["fail", "delete_second", "delete_first"] == [
+        result["name"] for result in results if result["name"]
+    ]
+
+
+def test_manager_url_timeout(server_url):
+    """Test the tasks still running at the URL deadline time out, not rollback"""
+    manager = TaskManager(
+        [f"{server_url}/"],
+        [
+            {
+                "name": "create",
+                "method": "GET",
+                "route": "create",
+                "rollback": [{"name": "delete", "method": "GET", "route": "slow"}],
+            },
+            {"name": "slow", "method": "GET", "route": "slow", "delay": 0},
+            {"name": "never", "method": "GET", "route": "never"},
+        ],
+        url_timeout=0.2,
+    )
+    start = time.monotonic()
+    results = run_manager(manager)
+
+    assert [
+        ("create", "SUCCESS"),
+        ("slow", "TIMEOUT"),
+        ("delete", "SUCCESS"),
+    ] == [(result["name"], result["status"]) for result in results]
+    assert time.monotonic() - start < 0.9
+
+
+def test_manager_run_timeout(server_url):
+    """Test the tasks still running at the run deadline time out at once"""
+    start = time.monotonic()
+    result = spintest(
+        [f"{server_url}/a/", f"{server_url}/b/"],
+        [{"method": "GET", "route": "/slow", "retry": 3, "delay": 0}],
+        parallel=True,
+        run_timeout=0.2,
+    )
+
+    assert False is result
+    assert time.monotonic() - start < 0.45
+    with pytest.raises(ValueError):
+        TaskManager(["http://test.com"], [], url_timeout=0)
+
+
+def test_manager_preflight_excludes_unreachable_urls(server_url):
+    """Test the pre-flight warms the pool up and excludes the dead URLs"""
+    dead_url = "http://127.0.0.1:1/"
+    manager = TaskManager(
+        [dead_url, f"{server_url}/"],
+        [{"method": "GET", "route": "test"}] * 2,
+        parallel=True,
+        preflight=True,
+        preflight_timeout=1,
+    )
+    result = asyncio.new_event_loop().run_until_complete(manager.run())
+
+    assert False is result
+    healthy_report, dead_report = manager.all_reports
+    assert f"{server_url}/" == healthy_report["url"]
+    assert ["SUCCESS", "SUCCESS"] == [
+        report["status"] for report in healthy_report["reports"]
+    ]
+    assert True is healthy_report["preflight"]["reachable"]
+    assert {"requests": 3, "created": 1, "reused": 2} == healthy_report["connections"]
+    assert dead_url == dead_report["url"]
+    assert [] == dead_report["reports"]
+    assert False is dead_report["preflight"]["reachable"]
+    assert dead_report["preflight"]["error"]
+    assert [dead_url, f"{server_url}/"] == manager.urls
+
+
+def test_manager_preflight_within_request_limits(server_url):
+    """Test the pre-flight takes request slots and feeds the circuit breaker"""
+    dead_url = "http://127.0.0.1:1/"
+    manager = TaskManager(
+        [dead_url, f"{server_url}/"],
+        [{"method": "GET", "route": "test"}],
+        preflight=True,
+        preflight_timeout=1,
+        max_in_flight=1,
+        breaker_threshold=1,
+    )
+    slots = []
+    slot = manager.scheduler.slot
+
+    def counted_slot(url):
+        slots.append(url)
+        return slot(url)
+
+    manager.scheduler.slot = counted_slot
+    result = asyncio.new_event_loop().run_until_complete(manager.run())
+
+    assert False is result
+    assert [dead_url, f"{server_url}/", f"{server_url}/test"] == slots
+    assert True is manager.scheduler.circuit_open(dead_url)
+    assert ["SUCCESS"] == [
+        report["status"] for report in manager.all_reports[0]["reports"]
+    ]
+
+
+@httpretty.activate
+def test_manager_reports_do_not_share_the_plan():
+    """Test mutating a report does not change the task of the next URL"""
+    for url in ("http://a.com", "http://b.com"):
+        httpretty.register_uri(
+            httpretty.POST,
+            f"{url}/test",
+            body=json.dumps({"items": [1, 2]}),
+        )
+
+    manager = TaskManager(
+        ["http://a.com", "http://b.com"],
+        [
+            {
+                "method": "POST",
+                "route": "/test",
+                "body": {"items": [1, 2]},
+                "expected": {"body": {"items": [1, 2]}},
+            }
+        ],
+    )
+    loop = asyncio.new_event_loop()
+    first = loop.run_until_complete(manager.next())
+    first["task"]["body"]["items"].append(3)
+    first["task"]["expected"]["body"]["items"].clear()
+    second = loop.run_until_complete(manager.next())
+
+    assert "SUCCESS" == second["status"]
+    assert {"items": [1, 2]} == second["task"]["body"]
+    assert {"items": [1, 2]} == json.loads(httpretty.last_request().body)
+    assert {"items": [1, 2]} == manager.plan.tasks[0].spec["body"]
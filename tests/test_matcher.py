@@ -0,0 +1,196 @@
+"""Test of the compiled body matchers."""
+
+import json
+import random
+
+import httpretty
+import pytest
+
+from spintest import logger, spintest
+from spintest.matcher import compile_matcher, TaskMatchers
+from spintest.plan import compile_task
+
+logger.disabled = True
+
+
+def reference_compare_body(body, expected, match_mode):
+    """Recursive comparison of body, as interpreted before compilation."""
+    if expected is None:
+        return True
+
+    if not isinstance(body, type(expected)):
+        return False
+
+    if isinstance(body, dict):
+        if match_mode == "strict" and body.keys() != expected.keys():
+            return False
+
+        if not set(expected).issubset(body):
+            return False
+
+        return all(
+            [
+                reference_compare_body(body[ek], expected[ek], match_mode)
+                for ek in expected.keys()
+            ]
+        )
+
+    elif isinstance(body, list):
+        if match_mode == "strict":
+            if len(body) != len(expected):
+                return False
+            for body_item in body:
+                for expected_item in expected:
+                    if reference_compare_body(body_item, expected_item, match_mode):
+                        break
+                else:
+                    return False
+        else:
+            for expected_item in expected:
+                for body_item in body:
+                    if reference_compare_body(body_item, expected_item, match_mode):
+                        break
+                else:
+                    return False
+        return True
+
+    else:
+        return body == expected
+
+
+def random_tree(rng, depth=0):
+    kind = rng.choice(["leaf", "leaf", "dict", "list"] if depth < 3 else ["leaf"])
+    if kind == "dict":
+        return {
+            rng.choice("abc"): random_tree(rng, depth + 1)
+            for _ in range(rng.randint(0, 3))
+        }
+    if kind == "list":
+        return [random_tree(rng, depth + 1) for _ in range(rng.randint(0, 3))]
+    return rng.choice([None, 0, 1, True, "a", "b", 1.5])
+
+
+@pytest.mark.parametrize("match_mode", ["strict", "partial"])
+def test_matcher_is_equivalent_to_recursive_comparison(match_mode):
+    rng = random.Random(42)
+    for _ in range(3000):
+        expected = random_tree(rng)
+        body = random_tree(rng)
+        assert reference_compare_body(body, expected, match_mode) == compile_matcher(
+            expected, match_mode
+        )(body), (body, expected)
+        assert compile_matcher(expected, match_mode)(expected) is True
+
+
+def random_records(rng, count):
+    return [
+        {
+            "id": rng.randint(0, count),
+            "name": rng.choice("ab"),
+            "tags": rng.choice([None, 1, True, 1.0, "a", [], ["a"]]),
+        }
+        for _ in range(count)
+    ]
+
+
+def test_strict_list_matcher_is_equivalent_to_recursive_comparison():
+    rng = random.Random(42)
+    for _ in range(500):
+        expected = random_records(rng, 5)
+        body = random_records(rng, 5)
+        if rng.random() < 0.5:
+            body = rng.sample(expected, 5)
+        assert reference_compare_body(body, expected, "strict") == compile_matcher(
+            expected
+        )(body), (body, expected)
+
+
+def test_strict_list_matcher_types():
+    matcher = compile_matcher([{"a": 1}, {"b": None}, "x", float("nan")])
+
+    assert matcher([{"b": [1]}, {"a": True}, "x", "x"])
+    assert matcher([{"a": 1}, {"a": 1}, {"a": 1}, {"a": 1}])
+    assert not matcher([{"a": 1.0}, "x", "x", "x"])
+    assert not matcher([float("nan"), "x", "x", "x"])
+    assert not compile_matcher([True])([1])
+    assert not compile_matcher([{"a": "x"}])([{"a": "x", "b": "y"}])
+
+
+def test_strict_list_matcher_large_list():
+    expected = [{"id": index, "name": str(index)} for index in range(20000)]
+    body = expected[::-1]
+    matcher = compile_matcher(expected)
+
+    class Item(dict):
+        pass
+
+    assert matcher(body)
+    assert not matcher(body[1:] + [{"id": -1, "name": "-1"}])
+    assert matcher(body[:-1] + [Item(body[-1])])
+
+
+def test_matcher_short_circuits():
+    looked_up = []
+
+    class Body(dict):
+        def __getitem__(self, key):
+            looked_up.append(key)
+            return dict.__getitem__(self, key)
+
+    matcher = compile_matcher({"a": "x", "b": "y"})
+
+    assert False is matcher(Body({"a": "z", "b": "y"}))
+    assert ["a"] == looked_up
+
+
+def test_task_matchers():
+    matchers = TaskMatchers(
+        {
+            "expected": {"body": {"a": None}, "expected_match": "partial"},
+            "fail_on": [{"code": 500}, {"body": {"error": None}}],
+        }
+    )
+
+    assert matchers.body({"a": 1, "b": 2})
+    assert None is matchers.fail_on[0]
+    assert matchers.fail_on[1]({"error": "foo"})
+    assert not matchers.fail_on[1]({"error": "foo", "b": 1})
+
+
+def test_compiled_task_matchers():
+    static_task = compile_task({"method": "GET", "expected": {"body": {"a": 1}}})
+    templated_task = compile_task(
+        {"method": "GET", "expected": {"body": {"a": "{{ foo }}"}}}
+    )
+
+    assert static_task.matchers.body({"a": 1})
+    assert None is templated_task.matchers
+
+
+@httpretty.activate
+def test_templated_expected_body():
+    httpretty.register_uri(
+        httpretty.POST, "http://test.com/test", body=json.dumps({"id": "1234"})
+    )
+    httpretty.register_uri(
+        httpretty.GET,
+        "http://test.com/test/1234",
+        body=json.dumps({"id": "1234", "status": "CREATED"}),
+    )
+
+    result = spintest(
+        ["http://test.com"],
+        [
+            {"method": "POST", "route": "/test", "output": "created"},
+            {
+                "method": "GET",
+                "route": "/test/{{ created.id }}",
+                "expected": {
+                    "body": {"id": "{{ created.id }}"},
+                    "expected_match": "partial",
+                },
+            },
+        ],
+    )
+
+    assert True is result
@@ -0,0 +1,172 @@
+"""Test of the scenario compilation."""
+
+import asyncio
+import httpretty
+import json
+
+from spintest import logger, spintest, TaskManager
+from spintest.plan import compile_scenario, compile_task
+from spintest.types import Int
+
+logger.disabled = True
+
+
+def test_compile_task():
+    task = {"method": "get", "route": "/test", "headers": {"X-Foo": "bar"}}
+    compiled_task = compile_task(task)
+
+    assert compiled_task.error is None
+    assert "http_request" == compiled_task.kind
+    assert "GET" == compiled_task.spec["method"]
+    assert {
+        "Accept": "application/json",
+        "Content-Type": "application/json",
+        "X-Foo": "bar",
+    } == compiled_task.spec["headers"]
+    assert {"method": "get", "route": "/test", "headers": {"X-Foo": "bar"}} == task
+
+
+def test_compile_task_invalid_method():
+    compiled_task = compile_task({"method": "FOO"})
+
+    assert "Invalid HTTP method." == compiled_task.error
+
+
+def test_compile_task_e2e():
+    async def target(url):
+        pass
+
+    assert "e2e" == compile_task({"type": "e2e", "target": target}).kind
+    assert "e2e" == compile_task({"target": target}).kind
+    assert (
+        "E2E task's 'target' must be an async function."
+        == compile_task({"type": "e2e", "target": print}).error
+    )
+
+
+def test_compile_scenario_resolves_rollback():
+    plan = compile_scenario(
+        [
+            {
+                "method": "POST",
+                "route": "/test",
+                "rollback": [
+                    "delete_test",
+                    {"method": "DELETE", "route": "/other"},
+                ],
+            },
+            {"name": "delete_test", "method": "DELETE", "route": "/test"},
+        ]
+    )
+
+    assert () == plan.errors
+    assert 2 == len(plan)
+
+    rollback = plan.tasks[0].rollback
+    assert ["delete_test", None] == [task.name for task in rollback]
+    assert [True, True] == [task.spec["ignore"] for task in rollback]
+    assert plan.tasks[1].spec["ignore"] is False
+
+
+def test_compile_scenario_errors():
+    plan = compile_scenario(
+        [
+            {"method": "POST", "rollback": ["unknown", ["toto"]]},
+            {"name": "invalid", "route": "/test"},
+        ]
+    )
+
+    assert 3 == len(plan.errors)
+
+
+@httpretty.activate
+def test_scenario_validation_before_any_request():
+    httpretty.register_uri(httpretty.GET, "http://test.com/test")
+
+    result = spintest(
+        ["http://test.com"],
+        [{"method": "GET", "route": "/test"}, {"method": "FOO", "route": "/test"}],
+    )
+
+    assert False is result
+    assert [] == httpretty.latest_requests()
+
+
+def test_compile_task_static():
+    static_task = compile_task({"method": "GET", "body": {"a": ["b", 1]}})
+    templated_task = compile_task(
+        {
+            "method": "GET",
+            "route": "/{{ foo }}",
+            "body": {"static": {"a": "b"}, "count": Int("{{ bar }}")},
+        }
+    )
+
+    assert static_task.static
+    assert not templated_task.static
+    assert ("route", "body") == templated_task.templated_keys
+    assert id(templated_task.spec["body"]["static"]) in templated_task.static_nodes
+
+    rendered_task = templated_task.render({"foo": "foo", "bar": "2"})
+    assert "/foo" == rendered_task["route"]
+    assert {"static": {"a": "b"}, "count": 2} == rendered_task["body"]
+    assert rendered_task["body"]["static"] is templated_task.spec["body"]["static"]
+    assert "/{{ foo }}" == templated_task.spec["route"]
+
+
+@httpretty.activate
+def test_manager_counts_skipped_renders():
+    httpretty.register_uri(
+        httpretty.GET, "http://test.com/test", body=json.dumps({"id": "1"})
+    )
+    httpretty.register_uri(httpretty.GET, "http://test.com/test/1")
+
+    manager = TaskManager(
+        ["http://test.com"],
+        [
+            {"method": "GET", "route": "/test", "output": "test"},
+            {"method": "GET", "route": "/test"},
+            {"method": "GET", "route": "/test/{{ test['id'] }}"},
+        ],
+    )
+    result = asyncio.new_event_loop().run_until_complete(manager.run())
+
+    assert True is result
+    assert 2 == manager.stats["renders_skipped"]
+    assert 1 == manager.stats["renders"]
+
+
+def test_compile_scenario_dependencies():
+    plan = compile_scenario(
+        [
+            {"name": "create", "method": "POST", "output": "created"},
+            {"name": "other", "method": "GET", "route": "/other"},
+            {"method": "GET", "route": "/{{ created.id }}", "output": "item"},
+            {"method": "GET", "depends_on": ["other"], "body": {"a": "{{ item }}"}},
+            {"method": "POST", "output": "created"},
+            {"type": "e2e", "target": target, "target_input": "{{ created }}"},
+        ]
+    )
+
+    assert () == plan.errors
+    assert [set(), set(), {0}, {1, 2}, {0, 2}, {4}] == [
+        set(task.dependencies) for task in plan
+    ]
+
+
+async def target(url, **kwargs):
+    pass
+
+
+def test_compile_scenario_dependency_errors():
+    plan = compile_scenario(
+        [
+            {"name": "a", "method": "GET", "depends_on": ["b"]},
+            {"name": "b", "method": "GET", "depends_on": ["a", "unknown"]},
+        ]
+    )
+
+    assert [
+        "Task 'b': unknown dependency 'unknown'.",
+        "Dependency cycle between the tasks 'a' -> 'b'.",
+    ] == list(plan.errors)
@@ -0,0 +1,142 @@
+"""Test of the polling tasks."""
+
+import asyncio
+import json
+import time
+
+import httpretty
+import pytest
+
+from spintest import logger, matcher, TaskManager
+
+logger.disabled = True
+
+
+def register_job(*statuses, status=200):
+    httpretty.register_uri(
+        httpretty.GET,
+        "http://test.com/jobs/1",
+        responses=[
+            httpretty.Response(body=json.dumps({"id": 1, "status": job}), status=status)
+            for job in statuses
+        ],
+    )
+
+
+def run_task(task):
+    manager = TaskManager(["http://test.com"], [task])
+    return asyncio.new_event_loop().run_until_complete(manager.next())
+
+
+@httpretty.activate
+def test_poll_until_condition():
+    register_job("PENDING", "RUNNING", "DONE")
+
+    start = time.monotonic()
+    result = run_task(
+        {
+            "type": "poll",
+            "method": "GET",
+            "route": "/jobs/1",
+            "until": {"body": {"status": "DONE"}},
+            "poll": {"interval": 0.05, "backoff": 2},
+            "expected": {"body": {"id": 1, "status": "DONE"}},
+            "output": "job",
+        }
+    )
+
+    assert "SUCCESS" == result["status"]
+    assert 3 == result["polls"]
+    assert 0.15 <= time.monotonic() - start < 0.4
+    assert 0.15 <= result["time_to_condition_sec"]
+    assert "DONE" == result["output"]["job"]["status"]
+
+
+@httpretty.activate
+def test_poll_timeout():
+    register_job("RUNNING")
+
+    result = run_task(
+        {
+            "type": "poll",
+            "method": "GET",
+            "route": "/jobs/1",
+            "until": {"body": {"status": "DONE"}},
+            "poll": {"interval": 0.02, "max_interval": 0.02, "timeout": 0.1},
+        }
+    )
+
+    assert "TIMEOUT" == result["status"]
+    assert 4 <= result["polls"]
+    assert None is result["time_to_condition_sec"]
+
+
+@httpretty.activate
+def test_poll_validates_the_response_once_met():
+    register_job("FAILED", status=404)
+
+    result = run_task(
+        {
+            "type": "poll",
+            "method": "GET",
+            "route": "/jobs/1",
+            "until": {"code": 404},
+            "expected": {"code": 200},
+        }
+    )
+
+    assert "FAILED" == result["status"]
+    assert "Invalid HTTP status code." == result["message"]
+    assert 1 == result["polls"]
+
+
+@httpretty.activate
+def test_poll_fail_on_stops_polling():
+    register_job("CANCELLED")
+
+    result = run_task(
+        {
+            "type": "poll",
+            "method": "GET",
+            "route": "/jobs/1",
+            "until": {"body": {"status": "DONE"}},
+            "fail_on": [{"body": {"status": "CANCELLED"}, "expected_match": "partial"}],
+        }
+    )
+
+    assert "FAILED" == result["status"]
+    assert 1 == result["polls"]
+
+
+def test_poll_requires_a_condition():
+    manager = TaskManager(
+        ["http://test.com"], [{"type": "poll", "method": "GET", "route": "/jobs/1"}]
+    )
+
+    assert ("Task '0': A poll task requires an 'until' condition.",) == (
+        manager.plan.errors
+    )
+
+
+@httpretty.activate
+def test_poll_condition_compiled_once(monkeypatch):
+    register_job("PENDING", "RUNNING", "DONE")
+    manager = TaskManager(
+        ["http://test.com"],
+        [
+            {
+                "type": "poll",
+                "method": "GET",
+                "route": "/jobs/1",
+                "until": {"body": {"status": "DONE"}},
+                "poll": {"interval": 0.01},
+            }
+        ],
+    )
+    monkeypatch.setattr(
+        matcher, "compile_matcher", lambda *args: pytest.fail("Matcher compiled.")
+    )
+    result = asyncio.new_event_loop().run_until_complete(manager.next())
+
+    assert "SUCCESS" == result["status"]
+    assert 3 == result["polls"]
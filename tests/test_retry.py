@@ -0,0 +1,120 @@
+"""Test of the retry policy."""
+
+import asyncio
+import time
+
+from email.utils import formatdate
+
+import httpretty
+
+from spintest import logger, TaskManager
+from spintest.retry import parse_retry_after, retriable, retry_delay
+
+logger.disabled = True
+
+
+def test_retriable():
+    assert retriable({}, 400)
+    assert retriable({"retry_on": [503, "timeout"]}, 503)
+    assert retriable({"retry_on": [503, "timeout"]}, "timeout")
+    assert not retriable({"retry_on": [503, "timeout"]}, 400)
+    assert not retriable({"retry_on": []}, "body")
+
+
+def test_parse_retry_after():
+    assert 2.5 == parse_retry_after("2.5")
+    assert 0.0 == parse_retry_after("-1")
+    assert None is parse_retry_after(None)
+    assert None is parse_retry_after("soon")
+    assert 8 < parse_retry_after(formatdate(time.time() + 10, usegmt=True)) <= 10
+
+
+def test_retry_delay():
+    task = {"delay": 0.1, "backoff": 2, "max_delay": 0.5}
+
+    assert [0.1, 0.2, 0.4, 0.5] == [
+        round(retry_delay(task, attempt), 3) for attempt in range(4)
+    ]
+    assert 1 == retry_delay({"delay": 1}, 5)
+    assert 0.5 == retry_delay({**task, "retry_after": True}, 0, retry_after=0.5)
+    assert 0.1 == retry_delay(task, 0, retry_after=0.5)
+    for _ in range(20):
+        assert 0.05 <= retry_delay({**task, "jitter": 0.5}, 0) <= 0.1
+
+
+def run_task(task):
+    manager = TaskManager(["http://test.com"], [task])
+    return asyncio.new_event_loop().run_until_complete(manager.next())
+
+
+@httpretty.activate
+def test_task_not_retried_on_other_codes():
+    httpretty.register_uri(httpretty.GET, "http://test.com/test", status=400)
+
+    result = run_task(
+        {"method": "GET", "route": "/test", "retry": 5, "retry_on": [503]}
+    )
+
+    assert "FAILED" == result["status"]
+    assert 1 == result["attempts"]
+
+
+@httpretty.activate
+def test_task_exponential_backoff():
+    httpretty.register_uri(
+        httpretty.GET,
+        "http://test.com/test",
+        responses=[httpretty.Response(body="{}", status=503)] * 3
+        + [httpretty.Response(body="{}")],
+    )
+
+    start = time.monotonic()
+    result = run_task(
+        {"method": "GET", "route": "/test", "retry": 5, "delay": 0.05, "backoff": 2}
+    )
+
+    assert "SUCCESS" == result["status"]
+    assert 4 == result["attempts"]
+    assert 0.35 <= time.monotonic() - start < 0.6
+
+
+@httpretty.activate
+def test_task_retry_timeout():
+    httpretty.register_uri(httpretty.GET, "http://test.com/test", status=503)
+
+    start = time.monotonic()
+    result = run_task(
+        {
+            "method": "GET",
+            "route": "/test",
+            "retry": 100,
+            "delay": 0.1,
+            "retry_timeout": 0.35,
+        }
+    )
+
+    assert "FAILED" == result["status"]
+    assert 4 == result["attempts"]
+    assert time.monotonic() - start < 0.35
+
+
+@httpretty.activate
+def test_task_retry_after():
+    httpretty.register_uri(
+        httpretty.GET,
+        "http://test.com/test",
+        responses=[
+            httpretty.Response(
+                body="{}", status=429, adding_headers={"Retry-After": "0.3"}
+            ),
+            httpretty.Response(body="{}"),
+        ],
+    )
+
+    start = time.monotonic()
+    result = run_task(
+        {"method": "GET", "route": "/test", "retry": 1, "delay": 0, "retry_after": True}
+    )
+
+    assert "SUCCESS" == result["status"]
+    assert 0.3 <= time.monotonic() - start
@@ -226,6 +226,7 @@ def test_rollback_multi_urls_parallel():
             {"name": "delete_test", "method": "DELETE", "route": "/test"},
         ],
         parallel=True,
+        parallel_mode="lockstep",
     )
 
     for _ in range(4):
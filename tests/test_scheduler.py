@@ -0,0 +1,220 @@
+"""Test of the request scheduling."""
+
+import asyncio
+import os
+import json
+import tempfile
+import time
+
+import httpretty
+import pytest
+
+from spintest import logger, spintest, TaskManager
+from spintest.scheduler import CircuitBreaker, RequestScheduler, TokenBucket
+
+logger.disabled = True
+
+
+def count_in_flight(scheduler, urls):
+    in_flight = {"now": 0, "max": 0}
+    waited = []
+
+    async def request(url):
+        async with scheduler.slot(url) as queue_sec:
+            waited.append(queue_sec)
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+            await asyncio.sleep(0.01)
+            in_flight["now"] -= 1
+
+    async def main():
+        await asyncio.gather(*[request(url) for url in urls])
+
+    asyncio.new_event_loop().run_until_complete(main())
+    return in_flight["max"], waited
+
+
+def test_scheduler_max_in_flight():
+    scheduler = RequestScheduler(max_in_flight=2)
+
+    in_flight, waited = count_in_flight(
+        scheduler, [f"http://test{index}.com" for index in range(6)]
+    )
+
+    assert 2 == in_flight
+    assert 0.02 <= max(waited)
+
+
+def test_scheduler_max_per_host():
+    scheduler = RequestScheduler(max_in_flight=3, max_per_host=1)
+
+    in_flight, _ = count_in_flight(scheduler, ["http://foo.com/a", "http://foo.com/b"])
+    assert 1 == in_flight
+
+    in_flight, _ = count_in_flight(
+        scheduler, ["http://foo.com", "http://bar.com", "http://baz.com"]
+    )
+    assert 3 == in_flight
+
+
+def test_scheduler_without_limits():
+    in_flight, waited = count_in_flight(RequestScheduler(), ["http://test.com"] * 5)
+
+    assert 5 == in_flight
+    assert max(waited) < 0.01
+
+
+def test_scheduler_invalid_limits():
+    with pytest.raises(ValueError):
+        RequestScheduler(max_in_flight=0)
+    with pytest.raises(ValueError):
+        RequestScheduler(max_per_host=0)
+    with pytest.raises(ValueError):
+        RequestScheduler(route_rate_limits={"/test": 0})
+    with pytest.raises(ValueError):
+        RequestScheduler(rate_limit=1, rate_burst=0)
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, burst=2)
+
+    waits = [bucket.reserve() for _ in range(4)]
+
+    assert [0.0, 0.0] == waits[:2]
+    assert 0.09 <= waits[2] <= 0.1
+    assert 0.19 <= waits[3] <= 0.2
+
+
+def test_scheduler_rate_limits():
+    scheduler = RequestScheduler(
+        url_rate_limit=10, route_rate_limits={"/slow/{{ id }}": 5}
+    )
+
+    async def main():
+        return [
+            await scheduler.throttle("http://foo.com/slow/1", "/slow/{{ id }}"),
+            await scheduler.throttle("http://foo.com/slow/2", "/slow/{{ id }}"),
+            await scheduler.throttle("http://foo.com/other", "/other"),
+            await scheduler.throttle("http://bar.com/other", "/other"),
+        ]
+
+    waits = asyncio.new_event_loop().run_until_complete(main())
+
+    assert 0.0 == waits[0]
+    assert 0.19 <= waits[1] <= 0.2
+    assert 0.09 <= waits[2] <= 0.1
+    assert 0.0 == waits[3]
+
+
+@httpretty.activate
+def test_manager_reports_queueing_time():
+    def slow_body(request, uri, headers):
+        time.sleep(0.1)
+        return [200, headers, json.dumps({})]
+
+    urls = [f"http://test{index}.com" for index in range(3)]
+    for url in urls:
+        httpretty.register_uri(httpretty.GET, f"{url}/test", body=slow_body)
+
+    with tempfile.TemporaryDirectory() as directory:
+        report_path = os.path.join(directory, "report.json")
+        result = spintest(
+            urls,
+            [{"method": "GET", "route": "/test"}],
+            parallel=True,
+            generate_report=report_path,
+            max_in_flight=1,
+        )
+        with open(report_path) as file:
+            reports = json.load(file)
+
+    assert True is result
+    queue_sec = sorted(report["total_queue_sec"] for report in reports)
+    assert 0.0 == queue_sec[0]
+    assert 0.15 <= queue_sec[-1]
+    for report in reports:
+        assert 0.1 <= report["reports"][0]["duration_sec"] < 0.15
+
+
+@httpretty.activate
+def test_manager_rate_limits_retries():
+    httpretty.register_uri(httpretty.GET, "http://test.com/test", status=500)
+
+    with tempfile.TemporaryDirectory() as directory:
+        report_path = os.path.join(directory, "report.json")
+        result = spintest(
+            ["http://test.com"],
+            [{"method": "GET", "route": "/test", "retry": 2, "delay": 0}],
+            generate_report=report_path,
+            rate_limit=10,
+        )
+        with open(report_path) as file:
+            reports = json.load(file)
+
+    assert False is result
+    assert 0.15 <= reports[0]["reports"][0]["limiter_sec"] <= 0.25
+    assert 0.15 <= reports[0]["total_limiter_sec"] <= 0.25
+
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker(2)
+    breaker.record("http://test.com/a", failed=True)
+    breaker.record("http://test.com/b", failed=False)
+    breaker.record("http://test.com/c", failed=True)
+
+    assert not breaker.is_open("http://test.com")
+    assert None is breaker.summary()
+
+    breaker.record("http://test.com/d", failed=True)
+    breaker.record("http://test.com/e", failed=False)
+    breaker.skip("http://test.com/f")
+
+    assert breaker.is_open("http://test.com/g")
+    assert not breaker.is_open("http://other.com")
+    assert (
+        "Circuit open for 1 base URLs after 2 consecutive connection failures, "
+        "tasks skipped: http://test.com (1)."
+    ) == breaker.summary()
+    with pytest.raises(ValueError):
+        CircuitBreaker(0)
+
+
+def test_circuit_breaker_skips_dead_urls(server_url):
+    dead_url = "http://127.0.0.1:1/"
+    manager = TaskManager(
+        [dead_url, f"{server_url}/"],
+        [
+            {
+                "name": "first",
+                "method": "GET",
+                "route": "first",
+                "retry": 5,
+                "delay": 0.2,
+                "ignore": True,
+                "rollback": [{"name": "undo", "method": "GET", "route": "undo"}],
+            },
+            {"name": "second", "method": "GET", "route": "second"},
+        ],
+        parallel=True,
+        parallel_mode="lockstep",
+        breaker_threshold=2,
+    )
+    start = time.monotonic()
+    result = asyncio.new_event_loop().run_until_complete(manager.run())
+
+    assert False is result
+    assert time.monotonic() - start < 0.6
+    dead_report, healthy_report = manager.all_reports
+    assert [
+        ("first", "FAILED", 2),
+        ("second", "SKIPPED", 0),
+        ("undo", "SKIPPED", 0),
+    ] == [
+        (report["name"], report["status"], report["attempts"])
+        for report in dead_report["reports"]
+    ]
+    assert True is dead_report["circuit_open"]
+    assert ["SUCCESS", "SUCCESS"] == [
+        report["status"] for report in healthy_report["reports"]
+    ]
+    assert False is healthy_report["circuit_open"]
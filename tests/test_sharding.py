@@ -0,0 +1,118 @@
+"""Test of the execution of URLs split across processes."""
+
+import asyncio
+import json
+import os
+import pytest
+import tempfile
+
+from spintest import logger, spintest
+from spintest.sharding import ShardedTaskManager, merge_stats, shard_options, split
+
+logger.disabled = True
+
+
+def test_split():
+    urls = [str(index) for index in range(5)]
+
+    assert [["0", "1"], ["2", "3"], ["4"]] == split(urls, 3)
+    assert [[url] for url in urls] == split(urls, 8)
+    assert [urls] == split(urls, 1)
+    assert [] == split([], 4)
+
+
+def test_merge_stats():
+    assert {"renders": 3, "template_cache": {"hits": 2, "misses": 1}} == merge_stats(
+        [
+            {"renders": 1, "template_cache": {"hits": 2, "misses": 0}},
+            {"renders": 2, "template_cache": {"hits": 0, "misses": 1}},
+        ]
+    )
+
+
+def test_shard_options():
+    assert {
+        "token": None,
+        "rate_limit": 5.0,
+        "url_rate_limit": None,
+        "route_rate_limits": {"/test": 1.0},
+        "max_in_flight": 3,
+        "max_per_host": 1,
+    } == shard_options(
+        {
+            "token": None,
+            "rate_limit": 10,
+            "url_rate_limit": None,
+            "route_rate_limits": {"/test": 2},
+            "max_in_flight": 7,
+            "max_per_host": 2,
+        },
+        2,
+    )
+
+
+def test_sharded_run_without_urls():
+    with tempfile.TemporaryDirectory() as directory:
+        report_path = os.path.join(directory, "report.json")
+        manager = ShardedTaskManager(
+            [], [{"method": "GET", "route": "test"}], generate_report=report_path
+        )
+
+        assert True is asyncio.new_event_loop().run_until_complete(manager.run())
+        with open(report_path) as file:
+            assert [] == json.load(file)
+
+
+def test_sharded_token_must_be_picklable():
+    with pytest.raises(ValueError):
+        ShardedTaskManager([], [], token=lambda: "ABC")
+
+
+def test_sharded_run_with_fewer_requests_in_flight_than_processes(server_url):
+    assert True is spintest(
+        [f"{server_url}/{index}/" for index in range(4)],
+        [{"method": "GET", "route": "test"}],
+        processes=4,
+        max_in_flight=1,
+    )
+
+
+def test_sharded_run_merges_reports(server_url):
+    urls = [f"{server_url}/{index}/" for index in range(4)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        report_path = os.path.join(directory, "report.json")
+        result = spintest(
+            urls,
+            [
+                {"method": "GET", "route": "test", "output": "test"},
+                {
+                    "method": "GET",
+                    "route": "{{ test['path'] }}/next",
+                    "expected": {"body": {"path": None}},
+                },
+            ],
+            token="ABC",
+            generate_report=report_path,
+            processes=2,
+        )
+        with open(report_path) as file:
+            reports = json.load(file)
+
+    assert True is result
+    assert urls == [report["url"] for report in reports]
+    for index, report in enumerate(reports):
+        assert [f"/{index}/test", f"/{index}/test/next"] == [
+            task["body"]["path"] for task in report["reports"]
+        ]
+        assert "***" == report["reports"][0]["output"]["__token__"]
+
+
+def test_sharded_run_fails_if_a_shard_fails(server_url):
+    result = spintest(
+        [f"{server_url}/{index}/" for index in range(2)] + [f"{server_url}/fail/"],
+        [{"method": "GET", "route": "test"}],
+        processes=3,
+    )
+
+    assert False is result
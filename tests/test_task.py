@@ -3,7 +3,12 @@ import json
 import uuid
 import httpretty
 import pytest
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
 from spintest import logger, spintest, TaskManager
+from spintest.task import Task
+from spintest.transport import RequestsTransport, base_url
 
 logger.disabled = True
 
@@ -951,6 +956,7 @@ def test_task_next_async():
         ["http://foo.com", "http://bar.com"],
         [{"method": "GET", "route": "/test"}],
         parallel=True,
+        parallel_mode="lockstep",
     )
     results = loop.run_until_complete(manager.next())
 
@@ -975,6 +981,7 @@ def test_task_next_async_failed():
         ["http://foo.com", "http://bar.com"],
         [{"method": "GET", "route": "/test"}],
         parallel=True,
+        parallel_mode="lockstep",
     )
     results = loop.run_until_complete(manager.next())
 
@@ -1020,3 +1027,135 @@ def test_task_with_ignore_option_followed_by_error():
 
     httpretty.disable()
     httpretty.reset()
+
+
+@httpretty.activate
+def test_task_decode_body_option():
+    """Test the body is only decoded if needed with decode_body set to False."""
+    httpretty.register_uri(
+        httpretty.GET, "http://test.com/test", body=json.dumps({"foo": "bar"})
+    )
+
+    loop = asyncio.new_event_loop()
+    task = Task(
+        "http://test.com", {"method": "GET", "route": "/test", "decode_body": False}, {}
+    )
+    result = loop.run_until_complete(task.run())
+
+    assert "SUCCESS" == result["status"]
+    assert None is result["body"]
+    assert False is task.response._decoded
+
+    task = Task(
+        "http://test.com",
+        {
+            "method": "GET",
+            "route": "/test",
+            "decode_body": False,
+            "expected": {"body": {"foo": "baz"}},
+        },
+        {},
+    )
+    result = loop.run_until_complete(task.run())
+
+    assert "FAILED" == result["status"]
+    assert {"foo": "bar"} == result["body"]
+
+
+class RequestsResponseTransport(object):
+    """Custom transport returning `requests` responses."""
+
+    async def request(self, method, url, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"id": 1}'
+        response.encoding = "utf-8"
+        return response
+
+
+def test_task_custom_transport_response():
+    task = Task(
+        "http://test.com",
+        {"method": "GET", "route": "/test", "expected": {"body": {"id": 1}}},
+        {},
+        transport=RequestsResponseTransport(),
+    )
+    result = asyncio.new_event_loop().run_until_complete(task.run())
+
+    assert "SUCCESS" == result["status"]
+    assert {"id": 1} == result["body"]
+
+
+def test_task_closes_its_own_transport(server_url):
+    task = Task(server_url, {"method": "GET", "route": "/"}, {})
+    result = asyncio.new_event_loop().run_until_complete(task.run())
+
+    assert "SUCCESS" == result["status"]
+    assert {} == task.transport.sessions
+
+
+def test_transport_keeps_the_session_of_requests_in_flight(server_url):
+    transport = RequestsTransport(idle_timeout=0.2)
+
+    async def send(route):
+        return await transport.request(
+            "GET", f"{server_url}{route}", None, {}, True, None
+        )
+
+    async def scenario():
+        slow = asyncio.ensure_future(send("/slow"))
+        await asyncio.sleep(0.3)
+        session = transport.sessions[base_url(server_url)]
+        await send("/")
+        assert transport.sessions[base_url(server_url)] is session
+        await slow
+        await transport.close()
+
+    asyncio.new_event_loop().run_until_complete(scenario())
+
+
+def test_transport_request_cancelled_before_its_thread_started(server_url):
+    transport = RequestsTransport(idle_timeout=0.2)
+    loop = asyncio.new_event_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=1))
+
+    async def send(route):
+        return await transport.request(
+            "GET", f"{server_url}{route}", None, {}, True, None
+        )
+
+    async def scenario():
+        slow = asyncio.ensure_future(send("/slow"))
+        queued = asyncio.ensure_future(send("/"))
+        await asyncio.sleep(0.1)
+        queued.cancel()
+        await slow
+        assert 0 == transport.in_flight[base_url(server_url)]
+
+        session = transport.sessions[base_url(server_url)]
+        await asyncio.sleep(0.3)
+        await send("/")
+        assert transport.sessions[base_url(server_url)] is not session
+        await transport.close()
+
+    loop.run_until_complete(scenario())
+
+
+def test_task_read_timeout(server_url):
+    manager = TaskManager(
+        [f"{server_url}/"],
+        [
+            {
+                "method": "GET",
+                "route": "slow",
+                "timeout": {"connect": 1, "read": 0.1},
+                "retry": 1,
+                "delay": 0,
+            }
+        ],
+    )
+    result = asyncio.new_event_loop().run_until_complete(manager.next())
+
+    assert "TIMEOUT" == result["status"]
+    assert "Request timed out." == result["message"]
+    assert result["duration_sec"] < 0.5
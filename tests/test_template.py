@@ -0,0 +1,202 @@
+"""Test of the template rendering."""
+
+import jinja2
+import json
+import pytest
+
+import httpretty
+
+from spintest import logger, spintest
+from spintest.template import (
+    compile_expression,
+    compile_template,
+    environment,
+    PathTemplate,
+    PathTemplateExpression,
+    referenced_names,
+    render,
+    render_tree,
+    resolve,
+    template_cache,
+    TemplateCache,
+    whole_expression,
+)
+from spintest.types import Int, Native
+
+logger.disabled = True
+
+
+def test_template_cache_hits_and_misses():
+    cache = TemplateCache(environment)
+
+    first = cache.get("{{ foo }}")
+    second = cache.get("{{ foo }}")
+    cache.get("{{ bar }}")
+
+    assert first is second
+    assert {"hits": 1, "misses": 2, "size": 2} == cache.stats()
+
+    cache.clear()
+    assert {"hits": 0, "misses": 0, "size": 0} == cache.stats()
+
+
+def test_template_cache_is_bounded():
+    cache = TemplateCache(environment, maxsize=2)
+
+    cache.get("{{ a }}")
+    cache.get("{{ b }}")
+    cache.get("{{ a }}")
+    cache.get("{{ c }}")
+
+    assert ["{{ a }}", "{{ c }}"] == list(cache.templates)
+
+
+def test_render():
+    assert "bar" == render("{{ foo['name'] }}", {"foo": {"name": "bar"}})
+
+
+OUTPUT = {
+    "user": {"id": 1, "name": "foo", "items": [{"sku": "a"}, {"sku": None}]},
+    "order": {"items": [{"sku": "b"}], "total": 2.5, "paid": False},
+    "text": "bar",
+}
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "{{ user.id }}",
+        "{{ user['name'] }}",
+        '{{ user["name"] }}',
+        "/users/{{ user.id }}/orders/{{ order['items'][0].sku }}",
+        "{{ order['items'][0]['sku'] }}",
+        "{{ order.items }}",
+        "{{ user['items'][-1].sku }}",
+        "{{ user['items'].1.sku }}",
+        "{{ order.total }}-{{ order.paid }}",
+        "{{ user.unknown }}",
+        "{{ user['items'][5] }}",
+        "{{ text }}}}",
+        "{{ user }}",
+    ],
+)
+def test_path_template_renders_like_jinja(source):
+    assert isinstance(compile_template(source), PathTemplate)
+    assert jinja2.Template(source).render(**OUTPUT) == render(source, OUTPUT)
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "{{ user.id | string }}",
+        "{% if user %}{{ user.id }}{% endif %}",
+        "{{ user.id ~ text }}",
+        "{{ none }}",
+        "{{- user.id -}}",
+        "{# comment #}{{ user.id }}",
+    ],
+)
+def test_compile_template_falls_back_to_jinja(source):
+    assert isinstance(compile_template(source), jinja2.Template)
+    assert jinja2.Template(source).render(**OUTPUT) == render(source, OUTPUT)
+
+
+def test_render_keeps_newlines():
+    tree = {
+        "trailing": "{{ text }}\n",
+        "crlf": "line1\r\n{{ text }}",
+        "jinja": "a\r\n{% if text %}{{ text | upper }}\r{% endif %}\n",
+    }
+
+    assert {
+        "trailing": "bar\n",
+        "crlf": "line1\r\nbar",
+        "jinja": "a\r\nBAR\r\n",
+    } == render_tree(tree, OUTPUT)
+
+
+def test_path_template_undefined_variable():
+    template = compile_template("id-{{ missing }}")
+
+    assert "id-" == template.render(**OUTPUT)
+    with pytest.raises(jinja2.UndefinedError):
+        compile_template("{{ user.unknown.id }}").render(**OUTPUT)
+    with pytest.raises(jinja2.UndefinedError):
+        compile_template("{{ order.items[0].sku }}").render(**OUTPUT)
+
+
+def test_path_template_expression():
+    expression = compile_expression("user['items'][0]")
+
+    assert isinstance(expression, PathTemplateExpression)
+    assert {"sku": "a"} == expression(**OUTPUT)
+    assert None is compile_expression("user.unknown")(**OUTPUT)
+    assert None is compile_expression("missing")(**OUTPUT)
+    assert 3 == compile_expression("user['items'] | length + 1")(**OUTPUT)
+
+
+def test_whole_expression():
+    assert "foo.id" == whole_expression("{{ foo.id }}")
+    assert "foo | length" == whole_expression(" {{ foo | length }} ")
+    assert None is whole_expression("/foo/{{ foo.id }}")
+    assert None is whole_expression("{{ foo }}-{{ bar }}")
+    assert None is whole_expression("{% if foo %}{{ foo }}{% endif %}")
+
+
+def test_resolve():
+    output = {"foo": {"id": 1, "items": [1, 2]}}
+
+    assert [1, 2] == resolve("{{ foo['items'] }}", output)
+    assert 1 == resolve("{{ foo.id }}", output)
+    assert "id-1" == resolve("id-{{ foo.id }}", output)
+
+
+def test_referenced_names():
+    tree = {
+        "route": "/foo/{{ foo.id }}",
+        "{{ bar }}": [{"count": Int("{{ baz | length }}")}, "{% if qux %}{% endif %}"],
+        "static": "{{ broken",
+    }
+
+    assert {"foo", "bar", "baz", "qux"} == referenced_names(tree)
+
+
+def test_render_tree():
+    output = {"foo": {"id": 2, "name": 'with "quotes"'}}
+    body = {"static": ["a", 1, None], "count": Int("{{ foo.id }}")}
+    tree = {
+        "route": "/foo/{{ foo.id }}",
+        "body": body,
+        "{{ foo.id }}": {"name": "{{ foo.name }}", "raw": Native("{{ foo }}")},
+    }
+
+    assert {
+        "route": "/foo/2",
+        "body": {"static": ["a", 1, None], "count": 2},
+        "2": {"name": 'with "quotes"', "raw": output["foo"]},
+    } == render_tree(tree, output)
+
+
+@httpretty.activate
+def test_template_cache_is_shared_across_urls():
+    httpretty.register_uri(
+        httpretty.GET, "http://foo.com/test", body=json.dumps({"id": "1"})
+    )
+    httpretty.register_uri(
+        httpretty.GET, "http://bar.com/test", body=json.dumps({"id": "1"})
+    )
+    httpretty.register_uri(httpretty.GET, "http://foo.com/test/1")
+    httpretty.register_uri(httpretty.GET, "http://bar.com/test/1")
+    template_cache.clear()
+
+    result = spintest(
+        ["http://foo.com", "http://bar.com"],
+        [
+            {"method": "GET", "route": "/test", "output": "test"},
+            {"method": "GET", "route": "/test/{{ test['id'] }}"},
+        ],
+    )
+
+    assert True is result
+    assert 1 == template_cache.misses
+    assert 1 == template_cache.hits
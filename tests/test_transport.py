@@ -0,0 +1,169 @@
+"""Test of the HTTP transports."""
+
+import asyncio
+import json
+import pytest
+import pytest_asyncio
+
+from spintest import logger, TaskManager
+from spintest.transport import (
+    AiohttpTransport,
+    RequestsTransport,
+    Response,
+    TransportError,
+    TransportTimeout,
+    get_transport,
+)
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import TestServer  # noqa: E402
+
+logger.disabled = True
+
+
+def create_app():
+    state = {"attempts": 0}
+
+    async def resource(request):
+        return web.json_response({"id": "1234", "status": "CREATED"})
+
+    async def flaky(request):
+        state["attempts"] += 1
+        if state["attempts"] < 2:
+            return web.json_response({"status": "CREATING"}, status=500)
+        return web.json_response({"status": "CREATED"})
+
+    async def echo(request):
+        return web.json_response(
+            {"path": request.path, "body": await request.json()}, status=201
+        )
+
+    async def slow(request):
+        await asyncio.sleep(0.5)
+        return web.json_response({})
+
+    async def conflict(request):
+        return web.json_response({"error": "conflict"}, status=409)
+
+    app = web.Application()
+    app.router.add_get("/resource", resource)
+    app.router.add_get("/flaky", flaky)
+    app.router.add_post("/echo/{id}", echo)
+    app.router.add_get("/conflict", conflict)
+    app.router.add_get("/slow", slow)
+    return app
+
+
+@pytest_asyncio.fixture
+async def server():
+    server = TestServer(create_app())
+    await server.start_server()
+    yield str(server.make_url(""))
+    await server.close()
+
+
+def test_response_body_is_decoded_once(monkeypatch):
+    response = Response(200, b'{"id": "1234"}')
+    decoded = []
+    json_loads = json.loads
+    monkeypatch.setattr(
+        json, "loads", lambda text: decoded.append(text) or json_loads(text)
+    )
+
+    assert {"id": "1234"} == response.body
+    assert response.body is response.body
+    assert 1 == len(decoded)
+    assert "foo" == Response(500, b"foo").body
+
+
+def test_get_transport():
+    assert isinstance(get_transport(), RequestsTransport)
+    assert isinstance(get_transport("aiohttp"), AiohttpTransport)
+
+    transport = AiohttpTransport()
+    assert get_transport(transport) is transport
+
+    with pytest.raises(ValueError):
+        get_transport("foo")
+
+
+@pytest.mark.asyncio
+async def test_aiohttp_transport_scenario(server):
+    manager = TaskManager(
+        [server],
+        [
+            {"method": "GET", "route": "/resource", "output": "resource"},
+            {
+                "method": "POST",
+                "route": "/echo/{{ resource['id'] }}",
+                "body": {"status": "{{ resource['status'] }}"},
+                "expected": {
+                    "code": 201,
+                    "body": {"path": "/echo/1234", "body": {"status": "CREATED"}},
+                },
+            },
+        ],
+        transport="aiohttp",
+    )
+
+    assert True is await manager.run()
+    assert {} == manager.transport.sessions
+    assert {"requests": 2, "created": 1, "reused": 1} == (
+        manager.all_reports[0]["connections"]
+    )
+
+
+@pytest.mark.asyncio
+async def test_aiohttp_transport_retry(server):
+    manager = TaskManager(
+        [server],
+        [{"method": "GET", "route": "/flaky", "retry": 2, "delay": 0}],
+        transport="aiohttp",
+    )
+
+    result = await manager.next()
+    assert "SUCCESS" == result["status"]
+    assert {"status": "CREATED"} == result["body"]
+
+
+@pytest.mark.asyncio
+async def test_aiohttp_transport_fail_on(server):
+    manager = TaskManager(
+        [server],
+        [
+            {
+                "method": "GET",
+                "route": "/conflict",
+                "fail_on": [{"code": 409}],
+                "retry": 5,
+                "delay": 0,
+            }
+        ],
+        transport="aiohttp",
+    )
+
+    result = await manager.next()
+    assert "FAILED" == result["status"]
+    assert "HTTP status code correspond with the fail_on code." == result["message"]
+
+
+@pytest.mark.asyncio
+async def test_aiohttp_transport_connection_error():
+    transport = AiohttpTransport()
+    with pytest.raises(TransportError):
+        await transport.request("GET", "http://127.0.0.1:1/")
+    await transport.close()
+
+
+@pytest.mark.asyncio
+async def test_aiohttp_transport_timeout(server):
+    transport = AiohttpTransport()
+    try:
+        with pytest.raises(TransportTimeout):
+            await transport.request("GET", f"{server}/slow", timeout=(1, 0.1))
+        response = await transport.request("GET", f"{server}/resource", timeout=(1, 1))
+    finally:
+        await transport.close()
+
+    assert 200 == response.status_code
@@ -2,7 +2,7 @@ import json
 import httpretty
 
 from spintest import logger, spintest
-from spintest.types import Int, List, Float, Bool
+from spintest.types import Int, List, Float, Bool, Native
 
 logger.disabled = True
 
@@ -46,3 +46,38 @@ def test_task_with_custom_type_evaluation():
 
     httpretty.disable()
     httpretty.reset()
+
+
+def test_task_with_native_value():
+    """Test spintest keeps the referenced value with the native type."""
+    httpretty.enable()
+    httpretty.register_uri(
+        httpretty.GET,
+        "http://test.com/test",
+        body=json.dumps({"inner": {"foo": 2, "bar": ["buz"], "qux": 'a "b"'}}),
+        status=200,
+    )
+    httpretty.register_uri(httpretty.POST, "http://test.com/test", status=200)
+
+    spintest(
+        ["http://test.com"],
+        [
+            {"method": "GET", "route": "/test", "output": "test"},
+            {
+                "method": "POST",
+                "route": "/test",
+                "body": {
+                    "inner": Native("{{ test['inner'] }}"),
+                    "text": "{{ test['inner']['qux'] }}",
+                },
+            },
+        ],
+    )
+
+    assert json.loads(httpretty.last_request().body) == {
+        "inner": {"foo": 2, "bar": ["buz"], "qux": 'a "b"'},
+        "text": 'a "b"',
+    }
+
+    httpretty.disable()
+    httpretty.reset()